@@ -0,0 +1,98 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 基于hash表的聚合实现, 不需要排序, 输出不保证key的顺序
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import hashlib
+import logging
+import os
+import struct
+
+import utils
+
+logger = logging.getLogger("dominic.internal")
+
+
+class HashAggregator(object):
+    """ 使用hash表按key聚合文件中的数据, 文件过大时会递归地重新切割后再聚合
+    """
+
+    def __init__(self, file_paths, size_limit, delimiter='\0', max_depth=4):
+        """
+        Args:
+            file_paths: 需要聚合的文件, 同一个key的数据需要在同一个文件中
+            size_limit: 单次在内存中聚合的文件大小上限
+            delimiter: key和value之间的分隔符
+            max_depth: 重新切割的最大层数, 超过后不再切割, 直接在内存中聚合
+        """
+        self._file_paths = file_paths
+        self._size_limit = size_limit
+        self._delimiter = delimiter
+        self._max_depth = max_depth
+
+    def _hash(self, key, depth):
+        """ 把层数混入key之后再hash, 每一层的切割和上一层以及切割分区时的hash无关
+        """
+        return struct.unpack('<I', hashlib.md5('%d\0%s' % (depth, key)).digest()[:4])[0]
+
+    def _repartition(self, f, depth):
+        """ 按key的hash将文件切割为多个小文件, 每一层使用不同的hash, 避免切割后仍然聚集在一起
+        :return: 切割后的文件路径
+        """
+        file_size = os.stat(f).st_size
+        output_count = int(file_size / self._size_limit) + 2
+        output_paths = ['%s.%d' % (f, i) for i in xrange(output_count)]
+        logger.debug("Repartition file for aggregation. [file={file_path} size={size} "
+                     "depth={depth} output_count={count}]"
+                     .format(file_path=f, size=file_size, depth=depth, count=output_count))
+
+        output_fds = [open(p, 'w') for p in output_paths]
+        try:
+            with open(f) as fd:
+                for l in fd:
+                    key = utils.split_record(l, self._delimiter)[0]
+                    output_fds[self._hash(key, depth) % output_count].write(l)
+        finally:
+            for output_fd in output_fds:
+                output_fd.close()
+        return output_paths
+
+    def _aggregate(self, f, depth):
+        """ 聚合一个文件, 文件大小超过size_limit时重新切割, 再逐个聚合切割后的文件
+        切割后最大的文件没有变小时(例如只有一个key), 继续切割也没有用, 直接在内存中聚合
+        :return: generator, (key, values)
+        """
+        file_size = os.stat(f).st_size
+        if file_size > self._size_limit and depth < self._max_depth:
+            sub_paths = self._repartition(f, depth)
+            if max(os.stat(p).st_size for p in sub_paths) < file_size:
+                next_depth = depth + 1
+            else:
+                logger.debug("Repartition does not shrink the file, stop repartitioning. "
+                             "[file={file_path} depth={depth}]".format(file_path=f, depth=depth))
+                next_depth = self._max_depth
+            for sub_path in sub_paths:
+                for i in self._aggregate(sub_path, next_depth):
+                    yield i
+                os.remove(sub_path)
+            return
+
+        groups = {}
+        with open(f) as fd:
+            for l in fd:
+                key, value = utils.split_record(l, self._delimiter)
+                groups.setdefault(key, []).append(value)
+        logger.debug("Aggregated file. [file={file_path} key_number={number} depth={depth}]"
+                     .format(file_path=f, number=len(groups), depth=depth))
+        for key, values in groups.iteritems():
+            yield key, iter(values)
+
+    def __repr__(self):
+        return '<HashAggregator id={_id}>'.format(_id=id(self))
+
+    def __iter__(self):
+        for f in self._file_paths:
+            for i in self._aggregate(f, 0):
+                yield i
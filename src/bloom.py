@@ -0,0 +1,66 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 简单的Bloom filter实现
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import hashlib
+import math
+import struct
+import types
+
+
+class BloomFilter(object):
+    """ Bloom filter, 使用md5的结果做double hashing, 生成多个hash值
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Args:
+            capacity: 预计加入的元素个数
+            error_rate: 达到capacity时的误判率
+        """
+        capacity = max(capacity, 1)
+        self._bit_count = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hash_count = max(1, int(round(self._bit_count / capacity * math.log(2))))
+        self._bits = bytearray(int(math.ceil(self._bit_count / 8)))
+
+    def tofile(self, path):
+        """ 保存到文件, 文件头是bit数和hash函数的个数
+        """
+        with open(path, 'wb') as fd:
+            fd.write(struct.pack('>QI', self._bit_count, self._hash_count))
+            fd.write(self._bits)
+
+    @classmethod
+    def fromfile(cls, path):
+        """ 从tofile保存的文件中加载
+        """
+        bloom_filter = cls.__new__(cls)
+        with open(path, 'rb') as fd:
+            bloom_filter._bit_count, bloom_filter._hash_count = \
+                struct.unpack('>QI', fd.read(struct.calcsize('>QI')))
+            bloom_filter._bits = bytearray(fd.read())
+        return bloom_filter
+
+    def _positions(self, key):
+        key = key.encode('utf-8') if isinstance(key, types.UnicodeType) else str(key)
+        digest = hashlib.md5(key).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        for i in xrange(self._hash_count):
+            yield (h1 + i * h2) % self._bit_count
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        for pos in self._positions(key):
+            if not self._bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __repr__(self):
+        return '<BloomFilter bits={bits} hashes={hashes}>'\
+            .format(bits=self._bit_count, hashes=self._hash_count)
@@ -0,0 +1,325 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 单机多进程的MapReduce执行, coordinator通过本地socket给worker进程分配任务
+
+    map任务处理输入文件中的一段, 按key切割后写入共享的temp_path, 每个reduce分区一个文件;
+    全部map任务完成后, reduce任务合并一个分区的全部文件, 结果写入output_path中的part文件.
+    任务的输出先写入带attempt编号的临时文件, 成功后再rename, 失败或者worker退出的任务会重新分配.
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import collections
+import glob
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import traceback
+
+import source
+import utils
+
+logger = logging.getLogger("dominic.internal")
+
+# 没有可分配的任务时, worker等待的时间
+WAIT_INTERVAL = 0.1
+
+
+def _map_output_path(temp_paths, name, map_id, partition):
+    output_dir = temp_paths[map_id % len(temp_paths)]
+    return os.path.join(output_dir, '%s_m%d_r%d' % (name.replace(' ', '_'), map_id, partition))
+
+
+def _run_map_task(job, task):
+    """ 处理输入文件中的一段, 按key的hash写入每个分区的文件
+    """
+    tag, file_path, start, end = task['split']
+    schema = job.env.schema if tag is None else None
+    _source = source.FileSplitSource(job.env.name, file_path, start, end, schema=schema)
+    lines = _source if tag is None else ((tag, l) for l in _source)
+
+    output_paths = [_map_output_path(job.env.temp_path, job.env.name, task['map_id'], r)
+                    for r in xrange(task['partition_count'])]
+    attempt_paths = ['%s.%d' % (p, task['attempt']) for p in output_paths]
+    strategy = job._make_strategy()
+    strategy.init(attempt_paths)
+    try:
+        for item in job._map_wrapper(lines):
+            strategy(item)
+    finally:
+        strategy.close()
+    for attempt_path, output_path in zip(attempt_paths, output_paths):
+        os.rename(attempt_path, output_path)
+
+
+def _run_reduce_task(job, task):
+    """ 合并一个分区的全部map输出, 执行reduce, 结果写入part文件
+    """
+    partition = task['partition']
+    input_paths = [_map_output_path(job.env.temp_path, job.env.name, map_id, partition)
+                   for map_id in xrange(task['map_count'])]
+    strategy = job._make_strategy()
+    output_path = task['output_path']
+    attempt_path = '%s.%d' % (output_path, task['attempt'])
+    with open(attempt_path, 'w') as out:
+        for grouped in job._group_files(input_paths, strategy.delimiter):
+            for l in job._reduce_wrapper(job._decode_keys(grouped)):
+                print(l, file=out)
+    os.rename(attempt_path, output_path)
+
+
+def _worker_main(job, address, authkey):
+    """ worker进程, 不断向coordinator请求任务, 直到收到exit
+    """
+    conn = multiprocessing.connection.Client(address, authkey=authkey)
+    try:
+        while True:
+            conn.send(('ready',))
+            message = conn.recv()
+            if message[0] == 'exit':
+                break
+            elif message[0] == 'wait':
+                time.sleep(WAIT_INTERVAL)
+                continue
+
+            task = message[1]
+            try:
+                if task['type'] == 'map':
+                    _run_map_task(job, task)
+                else:
+                    _run_reduce_task(job, task)
+            except KeyboardInterrupt as e:
+                raise e
+            except:
+                conn.send(('failed', task['id'], traceback.format_exc()))
+            else:
+                conn.send(('done', task['id']))
+    finally:
+        conn.close()
+
+
+class Coordinator(object):
+    """ 切分输入, 启动worker进程, 分配map和reduce任务, 跟踪任务的完成情况并重试失败的任务
+    """
+
+    def __init__(self, job, num_workers=4, split_size=None, max_retries=3):
+        """
+        Args:
+            job: MapReduce的实例, worker进程通过fork继承
+            num_workers: worker进程数
+            split_size: 每个map任务处理的输入大小, 默认为mem_limit
+            max_retries: 每个任务的最大重试次数, 超过后整个任务失败
+        """
+        if job.env._input_type not in ('file', 'multi'):
+            raise ValueError("Only file inputs are supported by the coordinator. [input_type={t}]"
+                             .format(t=job.env._input_type))
+        self._job = job
+        self._env = job.env
+        self._num_workers = num_workers
+        self._split_size = split_size if split_size else self._env.mem_limit
+        self._max_retries = max_retries
+
+        self._lock = threading.Condition()
+        self._pending = collections.deque()
+        self._running = {}
+        self._attempts = collections.defaultdict(int)
+        self._map_done = set()
+        self._reduce_done = set()
+        self._error = None
+        self._workers = []
+        self._restarts = 0
+
+        self._splits = self._get_splits()
+        total_size = sum(end - start for _, _, start, end in self._splits)
+        self._partition_count = int(total_size / job._partition_size()) + 1
+        self._output_dir = self._env.output_path[0]
+        self._output_paths = [os.path.join(self._output_dir, 'part-%05d' % r)
+                              for r in xrange(self._partition_count)]
+
+    def _get_splits(self):
+        """ 按split_size切分全部的输入文件
+        :return: list, (tag, 文件路径, 起始位置, 结束位置)
+        """
+        if isinstance(self._env.input_path, dict):
+            inputs = sorted(self._env.input_path.items())
+        else:
+            inputs = [(None, self._env.input_path)]
+        splits = []
+        for tag, file_paths in inputs:
+            for file_path in file_paths:
+                file_size = os.stat(file_path).st_size
+                for start in xrange(0, file_size, self._split_size):
+                    splits.append((tag, file_path, start, min(start + self._split_size, file_size)))
+        return splits
+
+    @property
+    def finished(self):
+        return self._error is not None or len(self._reduce_done) == self._partition_count
+
+    def _assign(self):
+        """ 分配一个任务, 没有可分配的任务时返回wait, 全部完成或者失败时返回exit
+        """
+        with self._lock:
+            if self.finished:
+                return ('exit',)
+            if not self._pending:
+                return ('wait',)
+            task = self._pending.popleft()
+            self._attempts[task['id']] += 1
+            task = dict(task, attempt=self._attempts[task['id']])
+            self._running[task['id']] = task
+            return ('task', task)
+
+    def _complete(self, task_id):
+        with self._lock:
+            task = self._running.pop(task_id)
+            if task['type'] == 'map':
+                self._map_done.add(task_id)
+                if len(self._map_done) == len(self._splits):
+                    logger.info("All map tasks are done. [map_count={count}]"
+                                .format(count=len(self._splits)))
+                    self._pending.extend(self._reduce_tasks())
+            else:
+                self._reduce_done.add(task_id)
+            self._lock.notify_all()
+
+    def _fail(self, task_id, reason):
+        """ 任务失败, 没有超过重试次数时重新加入等待队列
+        """
+        with self._lock:
+            task = self._running.pop(task_id)
+            logger.warn("Task failed. [task={task} reason={reason}]".format(task=task, reason=reason))
+            if self._attempts[task_id] > self._max_retries:
+                self._error = "Task failed too many times. [task={task}]".format(task=task)
+            else:
+                self._pending.append(task)
+            self._lock.notify_all()
+
+    def _map_tasks(self):
+        return [{
+            'id': ('map', i),
+            'type': 'map',
+            'map_id': i,
+            'split': split,
+            'partition_count': self._partition_count,
+        } for i, split in enumerate(self._splits)]
+
+    def _reduce_tasks(self):
+        return [{
+            'id': ('reduce', r),
+            'type': 'reduce',
+            'partition': r,
+            'map_count': len(self._splits),
+            'output_path': self._output_paths[r],
+        } for r in xrange(self._partition_count)]
+
+    def _serve(self, conn):
+        """ 处理一个worker的请求, worker异常退出时, 正在执行的任务重新分配
+        新的worker由run中的_check_workers启动
+        """
+        task_id = None
+        try:
+            while True:
+                message = conn.recv()
+                if message[0] == 'ready':
+                    response = self._assign()
+                    task_id = response[1]['id'] if response[0] == 'task' else None
+                    conn.send(response)
+                    if response[0] == 'exit':
+                        break
+                elif message[0] == 'done':
+                    task_id = None
+                    self._complete(message[1])
+                elif message[0] == 'failed':
+                    task_id = None
+                    self._fail(message[1], message[2])
+        except (EOFError, IOError):
+            if task_id is not None:
+                self._fail(task_id, "Worker exited unexpectedly.")
+        finally:
+            conn.close()
+
+    def _accept(self):
+        while True:
+            conn = self._listener.accept()
+            t = threading.Thread(target=self._serve, args=(conn,))
+            t.setDaemon(True)
+            t.start()
+
+    def _start_worker(self):
+        worker = multiprocessing.Process(target=_worker_main,
+                                         args=(self._job, self._listener.address, self._authkey))
+        worker.daemon = True
+        worker.start()
+        self._workers.append(worker)
+
+    def _check_workers(self):
+        """ 替换已经退出的worker, 包括还没有连接到coordinator就退出的worker, 需要持有self._lock
+        """
+        for worker in list(self._workers):
+            if worker.is_alive():
+                continue
+            worker.join()
+            self._workers.remove(worker)
+            logger.warn("Worker exited unexpectedly. [pid={pid} exitcode={code}]"
+                        .format(pid=worker.pid, code=worker.exitcode))
+            self._restarts += 1
+            if self._restarts > self._max_retries * self._num_workers:
+                self._error = "Workers exited too many times. [restarts={restarts}]"\
+                    .format(restarts=self._restarts)
+                return
+            self._start_worker()
+
+    def _cleanup(self):
+        """ 全部任务成功后, 删除map的输出, reduce排序的中间文件以及失败的attempt留下的文件
+        """
+        paths = [_map_output_path(self._env.temp_path, self._env.name, map_id, r)
+                 for map_id in xrange(len(self._splits)) for r in xrange(self._partition_count)]
+        for p in paths:
+            for f in [p] + glob.glob(p + '.*'):
+                if os.path.exists(f):
+                    os.remove(f)
+        for p in self._output_paths:
+            for f in glob.glob(p + '.*'):
+                os.remove(f)
+
+    def run(self):
+        """ 执行全部的任务
+        :return: list, reduce的输出文件路径
+        """
+        for p in self._env.temp_path:
+            utils.mkdir(p)
+        utils.mkdir(self._output_dir)
+
+        self._authkey = os.urandom(16)
+        self._listener = multiprocessing.connection.Listener(('localhost', 0),
+                                                            authkey=self._authkey)
+        # 没有输入时不会有map任务完成, 直接分配reduce任务
+        self._pending.extend(self._map_tasks() if self._splits else self._reduce_tasks())
+        logger.info("Start coordinator. [address={address} map_count={maps} "
+                    "partition_count={partitions} workers={workers}]"
+                    .format(address=self._listener.address, maps=len(self._splits),
+                            partitions=self._partition_count, workers=self._num_workers))
+
+        accepter = threading.Thread(target=self._accept)
+        accepter.setDaemon(True)
+        accepter.start()
+        with self._lock:
+            for _ in xrange(self._num_workers):
+                self._start_worker()
+            while not self.finished:
+                # 带超时的wait才能响应KeyboardInterrupt, 同时定期检查worker进程
+                self._lock.wait(1)
+                if not self.finished:
+                    self._check_workers()
+
+        for worker in self._workers:
+            worker.join()
+        self._listener.close()
+        if self._error:
+            raise RuntimeError(self._error)
+        self._cleanup()
+        return self._output_paths
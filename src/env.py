@@ -29,16 +29,37 @@ class Env(object):
         else:
             logger.error("Output path is empty!")
 
+        # 临时目录的list, 多个目录在不同的磁盘上时可以分摊读写
         if 'temp_path' in kwargs:
             self._temp_path = kwargs.pop('temp_path')
         else:
-            self._temp_path = os.path.join(tempfile.gettempdir(), 'dominic_%d' % int(time.time()))
+            self._temp_path = [os.path.join(tempfile.gettempdir(), 'dominic_%d' % int(time.time()))]
+        if isinstance(self._temp_path, basestring):
+            self._temp_path = [self._temp_path]
 
         if 'name' in kwargs:
             self._name = kwargs.pop('name')
         else:
             logger.error("name is empty!")
 
+        # 文件数据源的schema.Schema, 设置后map的输入为解析后的record
+        if 'schema' in kwargs:
+            self._schema = kwargs.pop('schema')
+        else:
+            self._schema = None
+
+        # 在map中使用的小数据源, name => 文件路径的list, 每个进程只加载一次, 参考MapReduce.side_input
+        if 'side_inputs' in kwargs:
+            self._side_inputs = kwargs.pop('side_inputs')
+        else:
+            self._side_inputs = {}
+
+        # segment额外构建Bloom filter时的误判率, 为None时不构建
+        if 'bloom_error_rate' in kwargs:
+            self._bloom_error_rate = kwargs.pop('bloom_error_rate')
+        else:
+            self._bloom_error_rate = None
+
         if 'input_type' in kwargs:
             self._input_type = kwargs.pop('input_type')
         else:
@@ -49,6 +70,57 @@ class Env(object):
         else:
             self._mem_limit = 100 * 1024 * 1024
 
+        # 排序等可以并行的步骤使用的线程数, 为1时不使用线程池
+        if 'num_threads' in kwargs:
+            self._num_threads = kwargs.pop('num_threads')
+        else:
+            self._num_threads = 1
+
+        # 数据全程保持为str, 不再转换为unicode, 需要时由用户代码自行解码
+        if 'bytes_mode' in kwargs:
+            self._bytes_mode = kwargs.pop('bytes_mode')
+        else:
+            self._bytes_mode = False
+
+        # 外排合并时一次最多同时打开的文件数
+        if 'max_fan_in' in kwargs:
+            self._max_fan_in = kwargs.pop('max_fan_in')
+        else:
+            self._max_fan_in = 64
+
+        # 是否对key进行保序编码, 开启后int, float, tuple类型的key会按照原始类型的顺序排序
+        if 'typed_keys' in kwargs:
+            self._typed_keys = kwargs.pop('typed_keys')
+        else:
+            self._typed_keys = False
+
+        # sort: 排序后聚合, key有序; hash: 使用hash表聚合, key无序, 省去排序的开销
+        if 'reduce_mode' in kwargs:
+            self._reduce_mode = kwargs.pop('reduce_mode')
+        else:
+            self._reduce_mode = 'sort'
+        if self._reduce_mode not in ('sort', 'hash'):
+            raise ValueError("Unsupported reduce mode. [reduce_mode={mode}]"
+                             .format(mode=self._reduce_mode))
+
+        # 将排序后的分区文件固化为segment, 之后可以通过MapReduce.segments查询
+        if 'index_output' in kwargs:
+            self._index_output = kwargs.pop('index_output')
+        else:
+            self._index_output = False
+        if self._index_output and self._reduce_mode != 'sort':
+            raise ValueError("Index output requires sort reduce mode. [reduce_mode={mode}]"
+                             .format(mode=self._reduce_mode))
+
+        # 二次排序, map输出(key, sort_key, value), 按key分区和聚合, values按sort_key排序
+        if 'secondary_sort' in kwargs:
+            self._secondary_sort = kwargs.pop('secondary_sort')
+        else:
+            self._secondary_sort = False
+        if self._secondary_sort and self._reduce_mode != 'sort':
+            raise ValueError("Secondary sort requires sort reduce mode. [reduce_mode={mode}]"
+                             .format(mode=self._reduce_mode))
+
     @property
     def input_path(self):
         return self._input_path
@@ -65,6 +137,46 @@ class Env(object):
     def name(self):
         return self._name
 
+    @property
+    def schema(self):
+        return self._schema
+
+    @property
+    def side_inputs(self):
+        return self._side_inputs
+
+    @property
+    def bloom_error_rate(self):
+        return self._bloom_error_rate
+
     @property
     def mem_limit(self):
         return self._mem_limit
+
+    @property
+    def reduce_mode(self):
+        return self._reduce_mode
+
+    @property
+    def typed_keys(self):
+        return self._typed_keys
+
+    @property
+    def secondary_sort(self):
+        return self._secondary_sort
+
+    @property
+    def max_fan_in(self):
+        return self._max_fan_in
+
+    @property
+    def num_threads(self):
+        return self._num_threads
+
+    @property
+    def bytes_mode(self):
+        return self._bytes_mode
+
+    @property
+    def index_output(self):
+        return self._index_output
@@ -0,0 +1,122 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 固定线程数的线程池, 任务队列有界, 提交任务过快时会阻塞, 避免内存和线程数无限增长
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import logging
+import Queue
+import threading
+import traceback
+
+logger = logging.getLogger("dominic.internal")
+
+# 通知工作线程退出
+_STOP = object()
+
+
+class BoundedExecutor(object):
+    """ 线程池, 提供submit和map两种使用方式
+    """
+
+    def __init__(self, num_workers=4, queue_size=None):
+        """
+        Args:
+            num_workers: 工作线程数
+            queue_size: 任务队列的大小, 也是map中同时处理中的最大任务数, 默认是num_workers的2倍
+        """
+        self._num_workers = num_workers
+        self._queue_size = queue_size if queue_size else num_workers * 2
+        self._tasks = Queue.Queue(self._queue_size)
+        self._is_shutdown = False
+        self._workers = []
+        for i in xrange(num_workers):
+            worker = threading.Thread(target=self._work, name='dominic-worker-%d' % i)
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is _STOP:
+                break
+            func, args, result_queue, index = task
+            try:
+                result = (index, True, func(*args))
+            except Exception as e:
+                logger.warn("Task failed in executor. [func={func} exception={exc}]"
+                            .format(func=func, exc=traceback.format_exc()))
+                result = (index, False, e)
+            if result_queue is not None:
+                result_queue.put(result)
+
+    def _check_running(self):
+        if self._is_shutdown:
+            raise RuntimeError("Executor has been shut down.")
+
+    def submit(self, func, *args):
+        """ 提交一个不关心结果的任务, 任务队列满时阻塞, 任务的异常只记录日志
+        """
+        self._check_running()
+        self._tasks.put((func, args, None, None))
+
+    def map(self, func, items, ordered=True):
+        """ 流式地对items中的每一个元素执行func, 同时处理中的任务数不超过queue_size
+        :param ordered: 为True时按items的顺序返回结果, 否则按完成的顺序返回
+        :return: generator, func的返回值, 任务抛出异常时在迭代时重新抛出
+        """
+        self._check_running()
+        # 同时在处理中的任务数有上限, 所以结果队列中的元素个数也有上限
+        results = Queue.Queue()
+        pending = {}
+        items = iter(items)
+        submitted = yielded = 0
+        exhausted = False
+        while True:
+            while not exhausted and submitted - yielded < self._queue_size:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                self._tasks.put((func, (item,), results, submitted))
+                submitted += 1
+            if submitted == yielded:
+                break
+
+            index, succeed, value = results.get()
+            if not succeed:
+                raise value
+            if ordered:
+                pending[index] = value
+                while yielded in pending:
+                    yielded += 1
+                    yield pending.pop(yielded - 1)
+            else:
+                yielded += 1
+                yield value
+
+    def shutdown(self, wait=True):
+        """ 不再接受新任务, 已经提交的任务执行完后工作线程退出
+        :param wait: 是否等待工作线程退出
+        """
+        if self._is_shutdown:
+            return
+        self._is_shutdown = True
+        for _ in self._workers:
+            self._tasks.put(_STOP)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def __repr__(self):
+        return '<BoundedExecutor workers={workers} queue_size={size}>'\
+            .format(workers=self._num_workers, size=self._queue_size)
@@ -0,0 +1,88 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 增量执行的状态, 记录每个输入文件读取到的位置和每个key的结果
+
+    状态保存在sqlite数据库中, 结果按key存储, 每次执行只读写新数据涉及的key,
+    耗时和新数据的大小成正比, 与历史数据的总量无关.
+    读取位置和结果在同一个事务中更新, 执行中断时不会出现读取位置和结果不一致.
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import logging
+import sqlite3
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+logger = logging.getLogger("dominic.internal")
+
+
+def _dumps(value):
+    return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _loads(data):
+    return pickle.loads(str(data))
+
+
+class TailState(object):
+    """ 增量执行的状态
+    positions: dict, 文件的绝对路径 => (设备号, inode, 偏移量), 见source.TailFileSource
+    结果通过get和items读取, key和value以pickle的形式存储, 所以key需要pickle后的结果稳定, 例如str, int
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: 状态文件的路径, 不存在时为空的状态
+        """
+        self._path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS positions "
+                               "(path TEXT PRIMARY KEY, device INTEGER, inode INTEGER, "
+                               "offset INTEGER)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS results "
+                               "(key BLOB PRIMARY KEY, value BLOB)")
+        self.positions = dict((str(p), (device, inode, offset)) for p, device, inode, offset
+                              in self._conn.execute("SELECT * FROM positions"))
+        logger.debug("Loaded incremental state. [path={path} files={files}]"
+                     .format(path=path, files=len(self.positions)))
+
+    def get(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM results WHERE key = ?",
+                                 (_dumps(key),)).fetchone()
+        return _loads(row[0]) if row else default
+
+    def items(self):
+        """ 遍历全部的结果
+        :return: generator, (key, value)
+        """
+        for key, value in self._conn.execute("SELECT key, value FROM results"):
+            yield _loads(key), _loads(value)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def update(self, results, positions):
+        """ 在一个事务中写入本次更新的结果和新的读取位置
+        :param results: dict, key => 合并后的结果
+        :param positions: 新的读取位置
+        """
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?)",
+                                   ((_dumps(k), _dumps(v)) for k, v in results.iteritems()))
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany("INSERT INTO positions VALUES (?, ?, ?, ?)",
+                                   ((p, device, inode, offset) for p, (device, inode, offset)
+                                    in positions.iteritems()))
+        self.positions = dict(positions)
+
+    def close(self):
+        self._conn.close()
+
+    def __repr__(self):
+        return '<TailState path={path} files={files}>'\
+            .format(path=self._path, files=len(self.positions))
@@ -7,11 +7,52 @@
 """
 
 from __future__ import absolute_import, division, print_function, with_statement
+import itertools
+import logging
+import operator
+import random
+import traceback
 
+import aggregator
+import cluster
 import env
+import executor
+import incremental
+import join
+import keycodec
+import operators
 import partitioner
+import placement
+import segment
 import sorter
 import source
+import utils
+
+
+logger = logging.getLogger('dominic.internal')
+
+# 抽样估算map输出大小时, 抽取的map输出条数
+SAMPLE_SIZE = 1000
+# 数据放入内存后, python对象相对于文本大小的膨胀系数
+MEMORY_EXPANSION = 4
+# 内存中缓存的每一行的固定开销, 包括str对象头, list中的指针, 以及聚合时拆分出的value
+RECORD_OVERHEAD = 80
+
+
+def _record_size(line):
+    """ 估算一行在内存中缓存和聚合时占用的大小, 行本身和拆分出的key, value各占一份
+    """
+    return 2 * len(line) + RECORD_OVERHEAD
+
+
+def _closing(iterable, closeable):
+    """ 迭代结束或者被回收时关闭closeable, 例如清理Sorter多轮合并产生的文件
+    """
+    try:
+        for item in iterable:
+            yield item
+    finally:
+        closeable.close()
 
 
 class MapReduce(object):
@@ -20,22 +61,40 @@ class MapReduce(object):
 
     def __init__(self, _env):
         self.env = env.Env(**_env)
+        self._segment_paths = []
 
     def map(self, line):
         """
         :param line: 一行数据
-        :return: yield (key, value)的generator
+        :return: yield (key, value)的generator, 开启secondary_sort时为(key, sort_key, value)
         """
         raise NotImplemented("Not implemented yet.")
 
     def reduce(self, key, values):
         """
         :param key: map中输出的key
-        :param values: 根据key聚合后的values
+        :param values: 根据key聚合后的values, 只能迭代一次的iterator, 需要多次使用时请先转换为list
         :return:
         """
         raise NotImplemented("Not implemented yet.")
 
+    def parse_side_input(self, name, line):
+        """ 解析side input的一行, 默认按\t切分为key和value
+        :param name: side input的名字
+        :param line: 一行数据
+        :return: (key, value), 返回None时忽略这一行
+        """
+        fields = line.rstrip('\n').split('\t', 1)
+        return fields[0], fields[1] if len(fields) > 1 else ''
+
+    def side_input(self, name):
+        """ 获取side input的索引, 用于map端的broadcast join, 每个进程只加载一次
+        :param name: env中side_inputs配置的名字
+        :return: join.BroadcastIndex
+        """
+        return join.load_index(name, self.env.side_inputs[name],
+                               lambda line: self.parse_side_input(name, line))
+
     def _map_wrapper(self, s):
         for l in s:
             for i in self.map(l):
@@ -46,24 +105,318 @@ class MapReduce(object):
             for i in self.reduce(key, values):
                 yield i
 
+    def _encode_item(self, strategy, item):
+        """ 将map输出转换为写入文件的字节串, 和切割时一样, 无法转换的数据记录日志后丢弃
+        :return: str, 丢弃时返回None
+        """
+        try:
+            return strategy.encode(item)
+        except (KeyboardInterrupt, partitioner.UnsupportedTypeException):
+            raise
+        except:
+            logger.warn("Unknown exception. [item={item} exception={exc}]"
+                        .format(item=item, exc=traceback.format_exc()))
+            return None
+
+    def _buffer_in_memory(self, _source, mapped, strategy):
+        """ 通过抽样估算map输出的大小, 能放入mem_limit时就将map输出全部缓存在内存中
+        缓存的是写入文件时的字节串, 和切割后从文件中读到的数据完全一致, map输出编码后即释放
+        :param _source: 数据源, 用于获取已处理的大小和总大小
+        :param mapped: map输出的iterator
+        :param strategy: 切割策略, 用于格式化map输出
+        :return: (格式化后的行, 是否已经全部缓存), 没有全部缓存时剩余的数据仍在mapped中
+        """
+        if self.env.index_output:
+            # 需要排序后的分区文件来生成segment
+            return [], False
+
+        mem_limit = self.env.mem_limit
+        lines = [self._encode_item(strategy, i) for i in itertools.islice(mapped, SAMPLE_SIZE)]
+        lines = [l for l in lines if l]
+        buffered_size = sum(_record_size(l) for l in lines)
+        if _source.current_size:
+            estimated_size = buffered_size * len(_source) / _source.current_size
+        else:
+            estimated_size = buffered_size
+        if estimated_size > mem_limit:
+            logger.debug("Map output is too large for memory. [estimated_size={size} "
+                         "mem_limit={limit}]".format(size=estimated_size, limit=mem_limit))
+            return lines, False
+
+        for item in mapped:
+            line = self._encode_item(strategy, item)
+            if not line:
+                continue
+            lines.append(line)
+            buffered_size += _record_size(line)
+            if buffered_size > mem_limit:
+                logger.info("Map output exceeds the estimation, fall back to spill. "
+                            "[estimated_size={size} mem_limit={limit}]"
+                            .format(size=estimated_size, limit=mem_limit))
+                return lines, False
+        logger.debug("Map output is buffered in memory. [size={size} count={count}]"
+                     .format(size=buffered_size, count=len(lines)))
+        return lines, True
+
+    def _group_in_memory(self, lines, delimiter, ordered=True, secondary_sort=False):
+        """ 在内存中按key聚合格式化后的行, ordered时按key的顺序输出, 与外排的结果保持一致
+        """
+        if secondary_sort:
+            # 和外排一样直接比较整行, 得到按(key, sort_key)排序的结果
+            lines.sort()
+            return self._group_sorted(((l.split(delimiter, 1)[0], l) for l in lines), delimiter,
+                                      secondary_sort)
+        return self._group_dict(lines, delimiter, ordered)
+
+    def _group_dict(self, lines, delimiter, ordered):
+        """ 使用dict聚合, 不需要对全部数据排序
+        """
+        groups = {}
+        for l in lines:
+            key, value = utils.split_record(l, delimiter)
+            groups.setdefault(key, []).append(value)
+        # 聚合后不再需要原始的行
+        del lines[:]
+        for key in (sorted(groups) if ordered else groups):
+            # 和外排时一样, values只能迭代一次
+            yield key, iter(groups[key])
+
+    def _group_sorted(self, _sorter, delimiter, secondary_sort=False):
+        """ 按key聚合外排后的数据, values是一个generator, 需要在下一个key之前消费
+        二次排序时去掉values中的sort_key
+        """
+        def get_value(line):
+            value = utils.split_record(line, delimiter)[1]
+            if secondary_sort:
+                value = utils.split_record(value, delimiter)[1]
+            return value
+
+        for key, group in itertools.groupby(_sorter, key=operator.itemgetter(0)):
+            yield key.rstrip('\n'), (get_value(line) for _, line in group)
+
+    def _make_strategy(self):
+        """ 根据env构建切割策略
+        """
+        return partitioner.HashSplitStrategy(
+            key_encoder=keycodec.encode if self.env.typed_keys else None,
+            key_fields=2 if self.env.secondary_sort else 1,
+            raw_bytes=self.env.bytes_mode)
+
+    def _partition_size(self):
+        """ 每个切割后的文件的预计大小, hash聚合时需要整个文件放入内存, 和HashAggregator的上限一致
+        """
+        if self.env.reduce_mode == 'hash':
+            return self.env.mem_limit / MEMORY_EXPANSION
+        return self.env.mem_limit
+
+    def _group_files(self, file_paths, delimiter, per_partition=False, placer=None):
+        """ 排序或者hash聚合切割后的文件, 返回按key聚合后的数据
+        :param file_paths: 切割后的文件, 同一个key只会出现在一个文件中
+        :param per_partition: 为True时每个文件单独返回
+        :param placer: placement.SpillPlacer, 用于选择排序结果的输出路径
+        :return: list, 每个元素是(key, values)的iterator
+        """
+        secondary_sort = self.env.secondary_sort
+        if self.env.reduce_mode == 'sort':
+            # 编码后的key直接比较整行即可, 二次排序时比较整行就是按(key, sort_key)排序
+            sorter_kwargs = {
+                'max_fan_in': self.env.max_fan_in,
+                'mem_limit': self.env.mem_limit,
+                'placer': placer,
+            }
+            if self.env.typed_keys or secondary_sort:
+                sorter_kwargs['key_func'] = None
+            _sorter = sorter.Sorter(file_paths, **sorter_kwargs)
+
+            if self.env.num_threads > 1:
+                with executor.BoundedExecutor(self.env.num_threads) as _executor:
+                    _sorter.sort(_executor)
+            else:
+                _sorter.sort()
+            if self.env.index_output:
+                for path in _sorter.sorted_file_paths:
+                    segment.build_segment(path, delimiter, bloom_error_rate=self.env.bloom_error_rate)
+                self._segment_paths = list(_sorter.sorted_file_paths)
+            if per_partition:
+                return [self._group_sorted(i, delimiter, secondary_sort)
+                        for i in _sorter.iter_files()]
+            return [_closing(self._group_sorted(_sorter, delimiter, secondary_sort), _sorter)]
+        else:
+            size_limit = self._partition_size()
+            if per_partition:
+                return [aggregator.HashAggregator([f], size_limit, delimiter) for f in file_paths]
+            else:
+                return [aggregator.HashAggregator(file_paths, size_limit, delimiter)]
+
+    def _decode_keys(self, grouped):
+        """ 开启typed_keys时, 还原编码后的key
+        """
+        if self.env.typed_keys:
+            return ((keycodec.decode(key), values) for key, values in grouped)
+        return grouped
+
+    def _execute(self, per_partition=False, _source=None):
+        """ 执行map, 切割, 排序或者hash聚合, 返回按key聚合后的数据
+        :param per_partition: 为True时每个分区单独返回, 同一个key只会出现在一个分区中
+        :param _source: 数据源, 默认根据env构建
+        :return: list, 每个元素是(key, values)的iterator
+        """
+        if _source is None:
+            _source = source.SourceFactory(self.env).get()
+
+        strategy = self._make_strategy()
+        mapped = self._map_wrapper(_source)
+        lines, in_memory = self._buffer_in_memory(_source, mapped, strategy)
+
+        if in_memory:
+            partitions = [self._group_in_memory(lines, strategy.delimiter,
+                                                self.env.reduce_mode == 'sort',
+                                                self.env.secondary_sort)]
+        else:
+            placer = placement.SpillPlacer(self.env.temp_path)
+            p = partitioner.Paritioner(self.env, mapped,
+                                       int(len(_source) / self._partition_size()) + 1,
+                                       self.env.temp_path, strategy, placer=placer)
+            strategy.init(p.output_file_paths, opener=placer.open)
+            # 已经缓存的行直接写入, 不需要再次编码
+            for l in lines:
+                strategy.write_line(l)
+            del lines[:]
+
+            # split files
+            p()
+            strategy.close()
+            placer.shutdown()
+
+            partitions = self._group_files(p.output_file_paths, strategy.delimiter, per_partition,
+                                           placer)
+
+        return [self._decode_keys(grouped) for grouped in partitions]
+
     def run(self):
-        _source = source.SourceFactory(self.env).get()
+        for grouped in self._execute():
+            for l in self._reduce_wrapper(grouped):
+                print(l)
+
+    def merge(self, key, old, new):
+        """ 增量执行时, 合并key之前的结果和新数据的结果
+        默认将两个结果作为values再执行一次reduce, 适用于sum, max, min这类满足结合律的reduce
+        :param key: reduce输出的key
+        :param old: 之前的结果
+        :param new: 新数据的结果
+        :return: 合并后的结果
+        """
+        for _, value in self.reduce(key, [old, new]):
+            return value
+
+    def run_incremental(self, state_path):
+        """ 增量执行, 只处理输入文件中上一次执行之后追加的数据, 通过merge合并到之前的结果中
+        reduce需要输出(key, value), 读取位置和每个key的结果保存在state_path中,
+        每次只读写新数据涉及的key, 全部的结果可以通过incremental.TailState(state_path).items()读取
+        :param state_path: 状态文件的路径, 不存在时处理全部数据
+        :return: dict, 本次更新的key => 合并后的结果
+        """
+        if self.env._input_type != 'file':
+            raise ValueError("Only file inputs are supported in incremental mode. "
+                             "[input_type={t}]".format(t=self.env._input_type))
+        state = incremental.TailState(state_path)
+        try:
+            _source = source.TailFileSource(self.env.name, self.env.input_path, state.positions,
+                                            schema=self.env.schema)
+            if not _source.size:
+                logger.info("No new data since last run. [source={source}]".format(source=_source))
+                return {}
+
+            missing = object()
+            updated = {}
+            for grouped in self._execute(_source=_source):
+                for key, value in self._reduce_wrapper(grouped):
+                    old = state.get(key, missing)
+                    updated[key] = value if old is missing else self.merge(key, old, value)
+            # 全部数据处理完之后, 结果和读取位置在同一个事务中更新
+            state.update(updated, _source.positions)
+            logger.info("Finish incremental run. [source={source} new_size={size} "
+                        "updated_keys={updated}]"
+                        .format(source=_source, size=_source.size, updated=len(updated)))
+            return updated
+        finally:
+            state.close()
+
+    def run_distributed(self, num_workers=4, **kwargs):
+        """ 使用多个worker进程执行, 结果写入output_path中的part文件, 不保证全局的key顺序
+        :param num_workers: worker进程数
+        :param kwargs: cluster.Coordinator的其他参数
+        :return: list, 输出文件的路径
+        """
+        return cluster.Coordinator(self, num_workers, **kwargs).run()
+
+    def segments(self):
+        """ 开启index_output时, 执行后可以通过返回的segment查询排序后的map输出
+        :return: segment.SegmentSet
+        """
+        return segment.SegmentSet(self._segment_paths, self.env.typed_keys)
+
+    def top(self, k, key=None):
+        """ 获取reduce输出中最大的k个, 每个分区保留k个, 最后合并, 不输出全部的结果
+        :param k: 返回的个数
+        :param key: 获取比较值的函数, 输入是reduce的一个输出
+        :return: list, 按比较值从大到小排列
+        """
+        result = operators.TopK(k, key)
+        for grouped in self._execute(per_partition=True):
+            result.merge(operators.TopK(k, key).extend(self._reduce_wrapper(grouped)))
+        return result.result()
+
+    def sample(self, k, seed=None):
+        """ 从reduce输出中均匀地随机抽取k个, 每个分区单独抽样, 最后合并
+        :param k: 抽样的个数
+        :param seed: 随机数种子
+        :return: list, 抽样的结果
+        """
+        rng = random.Random(seed)
+        result = operators.ReservoirSample(k, rng)
+        for grouped in self._execute(per_partition=True):
+            result.merge(operators.ReservoirSample(k, rng).extend(self._reduce_wrapper(grouped)))
+        return result.result()
 
-        strategy = partitioner.HashSplitStrategy()
-        p = partitioner.Paritioner(self.env, self._map_wrapper(_source),
-                                   int(len(_source) / self.env.mem_limit) + 1,
-                                   self.env.temp_path, strategy)
-        strategy.init(p.output_file_paths)
 
-        # split files
-        p()
+class JoinMapReduce(MapReduce):
+    """ reduce端join, 输入为多个带有tag的文件源, 按key聚合后同一个tag的values是连续的
+    env中的input_path为dict, tag => 文件路径的list
+    """
+
+    def __init__(self, _env):
+        _env = dict(_env, input_type='multi', secondary_sort=True)
+        super(JoinMapReduce, self).__init__(_env)
+
+    def map(self, tag, line):
+        """
+        :param tag: 数据所属数据源的tag
+        :param line: 一行数据
+        :return: yield (key, value)的generator
+        """
+        raise NotImplemented("Not implemented yet.")
 
-        _sorter = sorter.Sorter(p.output_file_paths)
+    def join(self, key, values_by_tag):
+        """
+        :param key: map中输出的key
+        :param values_by_tag: dict, tag => 这个tag下的values, 没有数据的tag不存在
+        :return:
+        """
+        raise NotImplemented("Not implemented yet.")
 
-        _sorter.sort()
+    def _map_wrapper(self, s):
+        # 按tag二次排序, value中也带上tag, 在reduce中区分来源
+        for tag, l in s:
+            for key, value in self.map(tag, l):
+                yield key, tag, tag, value
 
-        for l in self._reduce_wrapper(_sorter):
-            print(l)
+    def reduce(self, key, values):
+        values_by_tag = {}
+        tagged_values = (utils.split_record(v, '\0') for v in values)
+        for tag, group in itertools.groupby(tagged_values, key=operator.itemgetter(0)):
+            values_by_tag[tag] = [value for _, value in group]
+        return self.join(key, values_by_tag)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: map端broadcast join使用的内存索引, reduce端join参考job.JoinMapReduce
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import logging
+import traceback
+
+logger = logging.getLogger("dominic.internal")
+
+# 每个进程中已经加载的索引, 同一个side input只加载一次
+_loaded_indexes = {}
+
+
+class BroadcastIndex(object):
+    """ 将一个小的数据源全部加载到内存中, 按key建立hash索引
+    """
+
+    def __init__(self, file_paths, parse_func):
+        """
+        Args:
+            file_paths: 数据源的文件路径
+            parse_func: 解析函数, 输入为一行文本, 返回(key, value), 返回None时忽略这一行
+                        相同的key只保留最后一个value
+        """
+        self._file_paths = file_paths
+        self._index = {}
+        for file_path in file_paths:
+            with open(file_path) as fd:
+                for l in fd:
+                    try:
+                        record = parse_func(l)
+                    except KeyboardInterrupt as e:
+                        raise e
+                    except:
+                        logger.warn("Failed to parse side input. [line={line} exception={exc}]"
+                                    .format(line=l, exc=traceback.format_exc()))
+                        continue
+                    if record is not None:
+                        key, value = record
+                        self._index[key] = value
+
+        logger.debug("Loaded broadcast index. [files={files} key_number={number}]"
+                     .format(files=file_paths, number=len(self._index)))
+
+    def get(self, key, default=None):
+        return self._index.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __getitem__(self, key):
+        return self._index[key]
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return '<BroadcastIndex file_paths={file_paths} size={size}>'\
+            .format(file_paths=self._file_paths, size=len(self._index))
+
+
+def load_index(name, file_paths, parse_func):
+    """ 加载side input的索引, 每个进程只加载一次
+    :param name: side input的名字
+    :return: BroadcastIndex
+    """
+    cache_key = (name, tuple(file_paths))
+    if cache_key not in _loaded_indexes:
+        _loaded_indexes[cache_key] = BroadcastIndex(file_paths, parse_func)
+    return _loaded_indexes[cache_key]
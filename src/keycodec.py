@@ -0,0 +1,138 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 保序的key编码, 编码后的字符串直接比较的顺序与原始值的顺序一致
+
+    支持int, float, 字符串以及由它们组成的tuple, 不同类型之间按照 数字 < 字符串 < tuple 排序.
+    int和float编码在同一个数字空间中, 相等的数字编码相同, 例如1和1.0, 0.0和-0.0,
+    整数值的float在int64范围内时按int编码, 解码后得到int.
+    编码结果是二进制编码的16进制形式, 16进制不改变字节序, 并且不包含分隔符和换行符, 可以直接写入切割的文件.
+    每种类型的编码都是自终止的, 任何一个编码都不会是另一个编码的前缀.
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import binascii
+import struct
+import types
+
+_TUPLE_END = '\x00'
+_NUMBER = '\x10'
+_STRING = '\x30'
+_TUPLE = '\x40'
+
+# 字符串中的\x00转义为\x00\xff, 字符串以\x00\x00结尾, 保证短的字符串排在前面
+_STRING_ESCAPE = '\x00\xff'
+_STRING_END = '\x00\x00'
+
+_SIGN_BIT = 1 << 63
+_MASK = (1 << 64) - 1
+_INT_MIN = -(1 << 63)
+_INT_MAX = (1 << 63) - 1
+# float无法精确表示的大整数, 和最接近的float的差值的偏移, int64范围内差值的绝对值不超过1024
+_DELTA_BIAS = 1 << 15
+# 数字编码的最后一个字节, 只用于解码时还原类型, 相等的数字类型也相同, 不影响顺序
+_KIND_INT = '\x00'
+_KIND_FLOAT = '\x01'
+
+
+def _encode_float(value):
+    bits = struct.unpack('>Q', struct.pack('>d', value))[0]
+    # 负数翻转全部的位, 正数只翻转符号位
+    bits = bits ^ _MASK if bits & _SIGN_BIT else bits | _SIGN_BIT
+    return struct.pack('>Q', bits)
+
+
+def _encode_number(value):
+    """ 先按最接近的float排序, float相同的大整数再按和这个float的差值排序
+    非整数的float一定不会和整数共用同一个最接近的float, 所以差值为0
+    """
+    if isinstance(value, types.FloatType):
+        if value.is_integer() and _INT_MIN <= value <= _INT_MAX:
+            # 同时也把-0.0规范化为0
+            value = int(value)
+        else:
+            return _encode_float(value) + struct.pack('>H', _DELTA_BIAS) + _KIND_FLOAT
+    if not _INT_MIN <= value <= _INT_MAX:
+        raise ValueError("Integer key is out of 64-bit range. [key={key}]".format(key=value))
+    approx = float(value)
+    delta = value - int(approx)
+    return _encode_float(approx) + struct.pack('>H', delta + _DELTA_BIAS) + _KIND_INT
+
+
+def _encode(value, out):
+    if isinstance(value, (types.IntType, types.LongType, types.FloatType)):
+        out.append(_NUMBER)
+        out.append(_encode_number(value))
+    elif isinstance(value, types.StringTypes):
+        if isinstance(value, types.UnicodeType):
+            value = value.encode('utf-8')
+        out.append(_STRING)
+        out.append(value.replace('\x00', _STRING_ESCAPE))
+        out.append(_STRING_END)
+    elif isinstance(value, (types.TupleType, types.ListType)):
+        out.append(_TUPLE)
+        for i in value:
+            _encode(i, out)
+        out.append(_TUPLE_END)
+    else:
+        raise TypeError("Key type is not supported. [type={t} key={key}]"
+                        .format(t=type(value), key=value))
+
+
+def _decode(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == _NUMBER:
+        bits = struct.unpack('>Q', data[pos:pos + 8])[0]
+        bits = bits ^ _SIGN_BIT if bits & _SIGN_BIT else bits ^ _MASK
+        approx = struct.unpack('>d', struct.pack('>Q', bits))[0]
+        delta = struct.unpack('>H', data[pos + 8:pos + 10])[0] - _DELTA_BIAS
+        if data[pos + 10] == _KIND_FLOAT:
+            return approx, pos + 11
+        return int(int(approx) + delta), pos + 11
+    elif tag == _STRING:
+        chunks = []
+        while True:
+            end = data.index('\x00', pos)
+            chunks.append(data[pos:end])
+            if data[end + 1] == '\xff':
+                chunks.append('\x00')
+                pos = end + 2
+            else:
+                return ''.join(chunks), end + 2
+    elif tag == _TUPLE:
+        items = []
+        while data[pos] != _TUPLE_END:
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return tuple(items), pos + 1
+    else:
+        raise ValueError("Unknown type tag in encoded key. [tag={tag!r} pos={pos}]"
+                         .format(tag=tag, pos=pos - 1))
+
+
+def encode(value):
+    """ 将key编码为保序的字符串, unicode按utf-8编码, list按tuple编码
+    :param value: int, float, 字符串或者tuple
+    :return: 16进制字符串
+    """
+    out = []
+    _encode(value, out)
+    return binascii.hexlify(''.join(out))
+
+
+def decode(data):
+    """ 将encode的结果还原, 字符串还原为str
+    :param data: encode得到的16进制字符串
+    """
+    return decode_prefix(data)[0]
+
+
+def decode_prefix(data):
+    """ 解码data开头的一个key
+    :param data: 以encode的结果开头的16进制字符串
+    :return: (key, 剩余的16进制字符串)
+    """
+    raw = binascii.unhexlify(data)
+    value, pos = _decode(raw, 0)
+    return value, data[pos * 2:]
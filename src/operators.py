@@ -0,0 +1,70 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 有界内存的流式算子, 每个分区单独计算, 最后合并各个分区的结果
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import heapq
+import itertools
+import random
+
+
+class TopK(object):
+    """ 保留key最大的k个元素, 内部是一个大小为k的最小堆
+    """
+
+    def __init__(self, k, key=None):
+        """
+        Args:
+            k: 保留的元素个数
+            key: 获取比较值的函数, 默认直接比较元素本身
+        """
+        self._k = k
+        self._key = key if key else lambda x: x
+        self._heap = []
+        # 比较值相同时按加入顺序比较, 避免比较元素本身
+        self._counter = itertools.count()
+
+    def _push(self, entry):
+        if len(self._heap) < self._k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def add(self, item):
+        self._push((self._key(item), next(self._counter), item))
+
+    def extend(self, items):
+        for item in items:
+            self.add(item)
+        return self
+
+    def merge(self, other):
+        """ 合并另一个分区的结果, 比较值沿用另一个分区计算的结果
+        """
+        for entry in other._heap:
+            self._push(entry)
+        return self
+
+    def __len__(self):
+        return len(self._heap)
+
+    def result(self):
+        """ 按比较值从大到小返回保留的元素
+        """
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+class ReservoirSample(TopK):
+    """ 蓄水池抽样, 为每个元素分配一个随机数, 保留随机数最大的k个, 各分区的抽样结果可以直接合并
+    """
+
+    def __init__(self, k, rng=None):
+        """
+        Args:
+            k: 抽样的个数
+            rng: random.Random的实例, 多个分区需要共用同一个实例
+        """
+        rng = rng if rng else random.Random()
+        super(ReservoirSample, self).__init__(k, key=lambda _: rng.random())
@@ -35,48 +35,103 @@ class SplitStrategy(object):
     """ 切割的策略
     """
 
-    def __init__(self, delimiter='\0'):
+    def __init__(self, delimiter='\0', key_encoder=None, key_fields=1, raw_bytes=False):
+        """
+        Args:
+            delimiter: 字段之间的分隔符
+            key_encoder: key的编码函数, 例如keycodec.encode, 只对list和tuple生效
+            key_fields: 使用key_encoder编码的字段数, 二次排序时排序字段也需要编码
+            raw_bytes: 为True时str直接写入, 不再转换为unicode, 只有unicode会编码为utf-8
+        """
         self._delimiter = delimiter
+        self._key_encoder = key_encoder
+        self._key_fields = key_fields
+        self._raw_bytes = raw_bytes
         self._output_fds = None
 
     def __del__(self):
-        [fd.close() for fd in self._output_fds]
+        self.close()
+
+    def close(self):
+        if self._output_fds:
+            [fd.close() for fd in self._output_fds]
+            self._output_fds = None
 
     def flush(self):
         for fd in self._output_fds:
             fd.flush()
 
+    @property
+    def delimiter(self):
+        return self._delimiter
+
     @property
     def output_fds(self):
         return self._output_fds
 
-    def init(self, output_paths):
+    def init(self, output_paths, opener=open):
         """ 初始化, 注意需要先调用初始化函数
         :param output_paths:
+        :param opener: 打开输出文件的函数, 例如placement.SpillPlacer.open
         :return:
         """
-        self._output_fds = [open(output_path, 'w') for output_path in output_paths]
+        self._output_fds = [opener(output_path, 'w') for output_path in output_paths]
 
-    def _get_fd(self, item):
+    def _get_fd(self, line):
         """ 用于获取要写入的fd, 实现切分策略的地方
-        :param item:
+        :param line: encode之后的一行, 开启key_encoder时其中的key已经编码
         :return:
         """
         raise NotImplemented("Not implemented yet.")
 
+    def format(self, item):
+        """ 将一条数据格式化为写入文件的一行文本
+        :param item: list, tuple, dict或者字符串
+        :return: 带有换行符的一行文本
+        """
+        if self._key_encoder and not isinstance(item, (types.ListType, types.TupleType)):
+            raise UnsupportedTypeException("Only list and tuple support encoded keys. "
+                                           "[type={t} item={i}]".format(t=type(item), i=item))
+
+        if isinstance(item, (types.ListType, types.TupleType)):
+            if self._raw_bytes:
+                fields = [i if type(i) is str else utils.safestr(i) for i in item]
+            else:
+                fields = [str(i) for i in item]
+            if self._key_encoder:
+                try:
+                    fields[:self._key_fields] = [self._key_encoder(i)
+                                                 for i in item[:self._key_fields]]
+                except (TypeError, ValueError) as e:
+                    raise UnsupportedTypeException("Failed to encode key. [item={i} error={e}]"
+                                                   .format(i=item, e=e))
+            return self._delimiter.join(fields) + '\n'
+        elif isinstance(item, types.DictionaryType):
+            return json.dumps(item) + '\n'
+        elif isinstance(item, types.StringTypes):
+            # 注意: 默认读入的文件数据是有\n的, 所以不再追加换行
+            if self._raw_bytes:
+                return item if type(item) is str else utils.safestr(item)
+            return utils.safeunicode(item)
+        else:
+            raise UnsupportedTypeException("Data type is not supported. [type={t} item={i}]"
+                                           .format(t=type(item), i=item))
+
+    def encode(self, item):
+        """ 格式化后转换为写入文件的字节串, 和直接写入文件时的转换相同, unicode无法转换时抛出异常
+        :return: 带有换行符的str
+        """
+        return str(self.format(item))
+
+    def write_line(self, line):
+        """ 写入一行已经encode的数据
+        """
+        self._get_fd(line).write(line)
+
     def __call__(self, item):
-        output_fd = self._get_fd(item)
         try:
-            if isinstance(item, (types.ListType, types.TupleType)):
-                print(self._delimiter.join([str(i) for i in item]), file=output_fd)
-            elif isinstance(item, types.DictionaryType):
-                print(json.dumps(item), file=output_fd)
-            elif isinstance(item, types.StringTypes):
-                # 注意: print会自带一个回车, 默认读入的文件数据是有\n的
-                output_fd.write(utils.safeunicode(item))
-            else:
-                raise UnsupportedTypeException("Data type is not supported. [type={t} item={i}]"
-                                               .format(t=type(item), i=item))
+            # 先在当前线程中转换为str, 无法转换的数据只丢弃这一条, 不影响异步写入的其他数据
+            self.write_line(self.encode(item))
         except (KeyboardInterrupt, UnsupportedTypeException) as e:
             logger.warn("Unsupported action or user cancelled. [item={item} exception={exc}]"
                         .format(item=item, exc=traceback.format_exc()))
@@ -88,16 +143,25 @@ class SplitStrategy(object):
 
 class HashSplitStrategy(SplitStrategy):
     """ hash的策略来进行数据分割
+    按写入的行中的key分割, 开启key_encoder时使用编码后的key, 相等的key(例如1和1.0)一定在同一个文件中
     """
 
-    def __init__(self, key_func=lambda x: x[0], delimiter='\0', hash_func=None):
-        super(HashSplitStrategy, self).__init__(delimiter=delimiter)
-        self._key_func = key_func
+    def __init__(self, key_func=None, delimiter='\0', hash_func=None, key_encoder=None,
+                 key_fields=1, raw_bytes=False):
+        """
+        Args:
+            key_func: 从encode之后的一行中获取key的函数, 默认是第一个分隔符之前的部分, 和聚合时的key一致
+            hash_func: key的hash函数
+        """
+        super(HashSplitStrategy, self).__init__(delimiter=delimiter, key_encoder=key_encoder,
+                                                key_fields=key_fields, raw_bytes=raw_bytes)
+        self._key_func = key_func if key_func else \
+            lambda line: line.split(delimiter, 1)[0].rstrip('\n')
         # 默认的简单的hash方法
         self._hash_func = hash_func if hash_func else lambda x: hash(str(x))
 
-    def _get_fd(self, item):
-        key = self._key_func(item)
+    def _get_fd(self, line):
+        key = self._key_func(line)
         hashvalue_of_key = self._hash_func(key)
         return self.output_fds[hashvalue_of_key % len(self.output_fds)]
 
@@ -106,11 +170,12 @@ class RRSplitStrategy(SplitStrategy):
     """ Round-Robin均衡分割策略
     """
 
-    def __init__(self, delimiter='\0'):
-        super(RRSplitStrategy, self).__init__(delimiter=delimiter)
+    def __init__(self, delimiter='\0', key_encoder=None, key_fields=1, raw_bytes=False):
+        super(RRSplitStrategy, self).__init__(delimiter=delimiter, key_encoder=key_encoder,
+                                              key_fields=key_fields, raw_bytes=raw_bytes)
         self._current_fd_index = 0
 
-    def _get_fd(self, item):
+    def _get_fd(self, line):
         self._current_fd_index += 1
         return self.output_fds[self._current_fd_index % len(self.output_fds)]
 
@@ -119,7 +184,8 @@ class Paritioner(object):
     """ 切割数据源的数据
     """
 
-    def __init__(self, env, source, output_count, output_paths, split_strategy, line_handler=None):
+    def __init__(self, env, source, output_count, output_paths, split_strategy, line_handler=None,
+                 placer=None):
         """
         Args:
             source: 数据源, 可以通过迭代获取数据的类型即可
@@ -127,6 +193,7 @@ class Paritioner(object):
             output_paths: 输出文件的路径位置
             split_strategy: 切割策略
             line_handler: 行处理函数对象
+            placer: placement.SpillPlacer, 设置后按磁盘的剩余空间和写入速度选择输出路径
         """
         self._env = env
         self._source = source
@@ -134,6 +201,7 @@ class Paritioner(object):
         self._line_handler = line_handler
         self._split_strategy = split_strategy
         self._is_invoked = False
+        self._placer = placer
 
         self._output_paths = output_paths
         self._output_paths_cycle = itertools.cycle(output_paths)
@@ -158,10 +226,14 @@ class Paritioner(object):
         return self._output_file_paths
 
     def _get_output_path(self, source_name):
-        """ 类似Round-Robin负载均衡策略, 充分使用多个路径
+        """ 类似Round-Robin负载均衡策略, 充分使用多个路径; 设置了placer时由placer选择路径
+        每个输出文件的大小预计和mem_limit相当
         """
         self._counter += 1
-        output_dir = self._output_paths_cycle.next()
+        if self._placer:
+            output_dir = self._placer.place(self._env.mem_limit)
+        else:
+            output_dir = self._output_paths_cycle.next()
         source_name = source_name.replace(' ', '_')
         return os.path.join(output_dir, "%s_%d" % (source_name, self._counter))
 
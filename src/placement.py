@@ -0,0 +1,177 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 多个临时目录时, 按磁盘的剩余空间和写入速度分配切割和排序的输出文件
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import collections
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import executor
+import utils
+
+logger = logging.getLogger("dominic.internal")
+
+# 测试写入速度时写入的数据大小
+PROBE_SIZE = 1024 * 1024
+# 异步写入时, 每次提交给写入线程的数据大小
+CHUNK_SIZE = 1024 * 1024
+
+# 每个设备测得的写入速度, 同一个进程中只测试一次
+_write_speeds = {}
+
+
+def measure_write_speed(path, probe_size=PROBE_SIZE):
+    """ 在path中写入probe_size的数据并fsync, 测试所在设备的写入速度
+    :return: 字节每秒
+    """
+    device = os.stat(path).st_dev
+    if device not in _write_speeds:
+        fd, probe_path = tempfile.mkstemp(prefix='.dominic_probe_', dir=path)
+        try:
+            start = time.time()
+            os.write(fd, '\0' * probe_size)
+            os.fsync(fd)
+            elapsed = time.time() - start
+        finally:
+            os.close(fd)
+            os.remove(probe_path)
+        _write_speeds[device] = probe_size / max(elapsed, 1e-6)
+        logger.debug("Measured write speed. [path={path} device={device} speed={speed:.0f}B/s]"
+                     .format(path=path, device=device, speed=_write_speeds[device]))
+    return _write_speeds[device]
+
+
+class AsyncFile(object):
+    """ 写入时先缓存在内存中, 积累到CHUNK_SIZE后交给所在设备的写入线程
+    """
+
+    def __init__(self, path, _executor, mode='w'):
+        self._fd = open(path, mode)
+        self._executor = _executor
+        self._buffer = []
+        self._buffer_size = 0
+        # 写入线程中的异常, 在flush或者close时重新抛出
+        self._error = None
+
+    def _run(self, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            self._error = e
+            raise
+
+    def write(self, data):
+        # 和普通文件一样转换unicode, 转换失败时在调用的线程中抛出, 不会影响已经缓存的数据
+        if type(data) is not str:
+            data = str(data)
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= CHUNK_SIZE:
+            self._submit()
+
+    def _submit(self):
+        if self._buffer:
+            self._executor.submit(self._run, self._fd.write, ''.join(self._buffer))
+            self._buffer = []
+            self._buffer_size = 0
+
+    def _wait(self):
+        """ 同一个设备只有一个写入线程, 按提交的顺序写入, 等待之前提交的全部写入完成
+        """
+        done = threading.Event()
+        self._executor.submit(done.set)
+        done.wait()
+        if self._error:
+            raise self._error
+
+    def flush(self):
+        self._submit()
+        self._executor.submit(self._run, self._fd.flush)
+        self._wait()
+
+    def close(self):
+        if not self._fd.closed:
+            self._submit()
+            self._executor.submit(self._run, self._fd.close)
+            self._wait()
+
+
+class SpillPlacer(object):
+    """ 按设备分组临时目录, 新文件放在预计写入耗时最少的设备上, 每个设备有独立的写入线程
+    """
+
+    def __init__(self, paths):
+        """
+        Args:
+            paths: 临时目录的list, 同一个设备上可以有多个目录
+        """
+        self._devices = collections.OrderedDict()
+        for p in paths:
+            utils.mkdir(p)
+            self._devices.setdefault(os.stat(p).st_dev, []).append(p)
+
+        self._free_space = {}
+        self._write_speed = {}
+        self._assigned = {}
+        self._counters = {}
+        for device, device_paths in self._devices.iteritems():
+            stat = os.statvfs(device_paths[0])
+            self._free_space[device] = stat.f_bavail * stat.f_frsize
+            self._write_speed[device] = measure_write_speed(device_paths[0])
+            self._assigned[device] = 0
+            self._counters[device] = 0
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    @property
+    def devices(self):
+        return list(self._devices)
+
+    def device_of(self, path):
+        return os.stat(path).st_dev
+
+    def place(self, expected_size, exclude_path=None):
+        """ 为一个新文件选择目录, 优先选择剩余空间足够, 并且写入后总耗时最少的设备
+        :param expected_size: 文件的预计大小
+        :param exclude_path: 尽量不和这个文件放在同一个设备上, 例如排序时的输入文件
+        :return: 目录路径
+        """
+        with self._lock:
+            candidates = list(self._devices)
+            if exclude_path is not None and len(candidates) > 1:
+                exclude_device = self.device_of(exclude_path)
+                candidates = [d for d in candidates if d != exclude_device] or candidates
+            enough_space = [d for d in candidates
+                            if self._free_space[d] - self._assigned[d] >= expected_size]
+            device = min(enough_space or candidates,
+                         key=lambda d: (self._assigned[d] + expected_size) / self._write_speed[d])
+            self._assigned[device] += expected_size
+
+            device_paths = self._devices[device]
+            self._counters[device] += 1
+            return device_paths[self._counters[device] % len(device_paths)]
+
+    def open(self, path, mode='w'):
+        """ 打开一个异步写入的文件, 由文件所在设备的写入线程负责写入
+        """
+        device = self.device_of(os.path.dirname(path) or '.')
+        with self._lock:
+            if device not in self._executors:
+                self._executors[device] = executor.BoundedExecutor(num_workers=1)
+        return AsyncFile(path, self._executors[device], mode)
+
+    def shutdown(self):
+        """ 等待全部写入完成, 结束写入线程
+        """
+        for _executor in self._executors.values():
+            _executor.shutdown()
+        self._executors = {}
+
+    def __repr__(self):
+        return '<SpillPlacer devices={devices}>'.format(devices=dict(self._devices))
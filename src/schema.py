@@ -0,0 +1,130 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 声明式的数据格式, 支持tsv, csv和json lines, 解析为带类型的namedtuple
+
+    只解析projection中的字段, tsv和csv只切分到最后一个需要的字段为止;
+    解析失败的行只计数, 每error_log_interval个错误记录一次日志, 不记录traceback.
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import collections
+import csv
+import logging
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+logger = logging.getLogger("dominic.internal")
+
+
+class Field(object):
+    """ 一个字段的定义
+    """
+
+    __slots__ = ('name', 'type', 'default', 'index')
+
+    def __init__(self, name, type=str, default=None, index=None):
+        """
+        Args:
+            name: 字段名, 也是record中的属性名
+            type: 类型转换函数, 例如int, float, str
+            default: 字段为空或者不存在时的值
+            index: tsv和csv中的列号, 默认是字段在schema中的位置
+        """
+        self.name = name
+        self.type = type
+        self.default = default
+        self.index = index
+
+    def converter(self, format='tsv'):
+        """ 返回字段值的转换函数, 空值(None或者'')返回default
+        tsv和csv中的值都是str, str类型的字段不做转换;
+        json中的值可能是unicode, 数字或者bool, str类型的字段转换为str, unicode使用utf-8编码
+        """
+        _type, default = self.type, self.default
+        if _type is str:
+            if format != 'json':
+                return lambda v: v if v not in ('', None) else default
+            return lambda v: default if v in ('', None) else \
+                v.encode('utf-8') if isinstance(v, unicode) else str(v)
+        return lambda v: _type(v) if v not in ('', None) else default
+
+    def __repr__(self):
+        return '<Field name={name} type={t}>'.format(name=self.name, t=self.type)
+
+
+class Schema(object):
+    """ 数据格式的定义, 通过parse将一行文本解析为record
+    """
+
+    formats = ('tsv', 'csv', 'json')
+
+    def __init__(self, fields, format='tsv', delimiter=None, projection=None,
+                 error_log_interval=10000):
+        """
+        Args:
+            fields: Field或者字段名的list
+            format: tsv, csv或者json, json表示每行一个json对象
+            delimiter: 字段的分隔符, 默认tsv为\\t, csv为逗号
+            projection: 需要的字段名, 默认全部字段, 不需要的字段不会解析
+            error_log_interval: 每多少个解析错误记录一次日志
+        """
+        if format not in self.formats:
+            raise ValueError("Unsupported schema format. [format={format}]".format(format=format))
+        self._fields = [f if isinstance(f, Field) else Field(f) for f in fields]
+        self._format = format
+        self._delimiter = delimiter if delimiter else {'tsv': '\t', 'csv': ','}.get(format)
+        self._error_log_interval = error_log_interval
+        self._error_count = 0
+
+        fields_by_name = dict((f.name, f) for f in self._fields)
+        names = projection if projection else [f.name for f in self._fields]
+        projected = [fields_by_name[name] for name in names]
+        self.record_type = collections.namedtuple('Record', names)
+
+        positions = dict((f.name, i if f.index is None else f.index)
+                         for i, f in enumerate(self._fields))
+        self._getters = [(positions[f.name] if format != 'json' else f.name, f.converter(format))
+                         for f in projected]
+        # 只需要切分到最后一个需要的字段
+        self._max_split = max(positions[f.name] for f in projected) + 1 if projected else 0
+
+    @property
+    def error_count(self):
+        return self._error_count
+
+    def _split(self, line):
+        line = line.rstrip('\r\n')
+        if self._format == 'csv' and '"' in line:
+            # 带引号的行交给csv模块处理
+            return next(csv.reader([line], delimiter=self._delimiter))
+        return line.split(self._delimiter, self._max_split)
+
+    def _parse(self, line):
+        if self._format == 'json':
+            obj = json.loads(line)
+            return self.record_type._make([convert(obj.get(name)) for name, convert in self._getters])
+        parts = self._split(line)
+        # 和json中不存在的字段一样, 行尾缺少的列使用default
+        count = len(parts)
+        return self.record_type._make([convert(parts[i] if i < count else None)
+                                       for i, convert in self._getters])
+
+    def parse(self, line):
+        """ 解析一行文本
+        :return: record, 解析失败时返回None
+        """
+        try:
+            return self._parse(line)
+        except (ValueError, TypeError, IndexError, AttributeError, csv.Error) as e:
+            self._error_count += 1
+            if (self._error_count - 1) % self._error_log_interval == 0:
+                logger.warn("Failed to parse line with schema. [error_count={count} line={line!r} "
+                            "error={error}]".format(count=self._error_count, line=line, error=e))
+            return None
+
+    def __repr__(self):
+        return '<Schema format={format} fields={fields}>'\
+            .format(format=self._format, fields=[f.name for f in self._fields])
@@ -0,0 +1,236 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+"""
+    @brief: 将排序后的文件固化为只读的segment, 支持按key查询和按范围扫描
+
+    segment就是排序后的数据文件本身, 另外生成三个辅助文件:
+        .idx: 稀疏索引, 每个block第一行的key和偏移量
+        .meta: json格式的元信息, 行数, key的个数, 最小和最大的key
+        .bloom: 可选的Bloom filter
+    查询时mmap数据文件, 在稀疏索引上二分查找到block, 再顺序扫描block内的行.
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import binascii
+import bisect
+import heapq
+import logging
+import mmap
+import os
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import bloom
+import keycodec
+
+logger = logging.getLogger("dominic.internal")
+
+# 每个block的大小, block越小索引越大, 查询时扫描的数据越少
+BLOCK_SIZE = 4 * 1024
+
+
+def _iter_lines(data, start=0):
+    """ 从start开始遍历mmap中的行
+    :return: generator, (偏移量, 不带换行符的行)
+    """
+    size = len(data)
+    pos = start
+    while pos < size:
+        end = data.find('\n', pos)
+        if end < 0:
+            end = size
+        yield pos, data[pos:end]
+        pos = end + 1
+
+
+def build_segment(data_path, delimiter='\0', block_size=BLOCK_SIZE, bloom_error_rate=None):
+    """ 为排序后的文件生成稀疏索引和元信息, 数据文件本身不做修改
+    :param data_path: 按key排序后的文件, 例如Sorter输出的.sorted文件
+    :param bloom_error_rate: 设置后额外生成Bloom filter
+    """
+    line_count = key_count = 0
+    min_key = max_key = None
+    if os.path.exists(data_path + '.bloom'):
+        # 之前生成的Bloom filter不再对应这个文件
+        os.remove(data_path + '.bloom')
+    with open(data_path, 'rb') as fd, open(data_path + '.idx', 'w') as index_fd:
+        if os.fstat(fd.fileno()).st_size:
+            data = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            next_block = 0
+            for offset, line in _iter_lines(data):
+                key = line.split(delimiter, 1)[0]
+                if max_key is not None and key < max_key:
+                    raise ValueError("Keys are not sorted in segment data. [data={data_path} "
+                                     "offset={offset} key={key!r} previous={previous!r}]"
+                                     .format(data_path=data_path, offset=offset, key=key,
+                                             previous=max_key))
+                if offset >= next_block:
+                    index_fd.write('%s%s%d\n' % (key, delimiter, offset))
+                    next_block = offset + block_size
+                if key != max_key:
+                    key_count += 1
+                    max_key = key
+                if min_key is None:
+                    min_key = key
+                line_count += 1
+
+            if bloom_error_rate:
+                bloom_filter = bloom.BloomFilter(key_count, bloom_error_rate)
+                for _, line in _iter_lines(data):
+                    bloom_filter.add(line.split(delimiter, 1)[0])
+                bloom_filter.tofile(data_path + '.bloom')
+            data.close()
+
+    meta = {
+        'line_count': line_count,
+        'key_count': key_count,
+        # key可能不是合法的utf-8, 以16进制保存
+        'min_key': min_key if min_key is None else binascii.hexlify(min_key),
+        'max_key': max_key if max_key is None else binascii.hexlify(max_key),
+        'delimiter': delimiter,
+        'block_size': block_size,
+    }
+    with open(data_path + '.meta', 'w') as fd:
+        fd.write(json.dumps(meta))
+    logger.debug("Built segment. [data={data_path} line_count={lines} key_count={keys}]"
+                 .format(data_path=data_path, lines=line_count, keys=key_count))
+    return Segment(data_path)
+
+
+class Segment(object):
+    """ 一个只读的segment, 需要先通过build_segment生成索引
+    """
+
+    def __init__(self, data_path, typed_keys=False):
+        """
+        Args:
+            data_path: 数据文件的路径
+            typed_keys: 数据中的key是否经过keycodec编码, 为True时查询的key和返回的key都是原始类型
+        """
+        self._data_path = data_path
+        self._typed_keys = typed_keys
+        with open(data_path + '.meta') as fd:
+            self._meta = json.loads(fd.read())
+        self._delimiter = str(self._meta['delimiter'])
+        self._min_key = self._meta['min_key']
+        self._max_key = self._meta['max_key']
+        if self._min_key is not None:
+            self._min_key = binascii.unhexlify(self._min_key)
+            self._max_key = binascii.unhexlify(self._max_key)
+
+        self._index_keys = []
+        self._index_offsets = []
+        with open(data_path + '.idx') as fd:
+            for l in fd:
+                key, offset = l.rstrip('\n').rsplit(self._delimiter, 1)
+                self._index_keys.append(key)
+                self._index_offsets.append(int(offset))
+
+        bloom_path = data_path + '.bloom'
+        self._bloom = bloom.BloomFilter.fromfile(bloom_path) if os.path.exists(bloom_path) else None
+
+        self._fd = open(data_path, 'rb')
+        if os.fstat(self._fd.fileno()).st_size:
+            self._data = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = ''
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+            self._data = ''
+        self._fd.close()
+
+    @property
+    def line_count(self):
+        return self._meta['line_count']
+
+    @property
+    def key_count(self):
+        return self._meta['key_count']
+
+    def _encode(self, key):
+        return keycodec.encode(key) if self._typed_keys else key
+
+    def _decode(self, key):
+        return keycodec.decode(key) if self._typed_keys else key
+
+    def _scan_from(self, key):
+        """ 从第一个可能包含key的block开始遍历
+        相同的key可能跨越block, 所以从第一个起始key小于key的block开始
+        """
+        block = max(bisect.bisect_left(self._index_keys, key) - 1, 0)
+        start = self._index_offsets[block] if self._index_offsets else 0
+        for _, line in _iter_lines(self._data, start):
+            fields = line.split(self._delimiter, 1)
+            yield fields[0], fields[1] if len(fields) > 1 else ''
+
+    def might_contain(self, key):
+        """ 根据key的范围和Bloom filter判断key是否可能存在, 参数为编码后的key
+        """
+        if self._min_key is None or not self._min_key <= key <= self._max_key:
+            return False
+        return self._bloom is None or key in self._bloom
+
+    def get(self, key):
+        """ 查询一个key的全部value
+        :return: list, key不存在时为空
+        """
+        key = self._encode(key)
+        if not self.might_contain(key):
+            return []
+        values = []
+        for k, value in self._scan_from(key):
+            if k > key:
+                break
+            elif k == key:
+                values.append(value)
+        return values
+
+    def scan(self, start=None, end=None):
+        """ 按key的顺序遍历start <= key < end的数据
+        :return: generator, (key, value)
+        """
+        start = self._encode(start) if start is not None else None
+        end = self._encode(end) if end is not None else None
+        for k, value in self._scan_from(start if start is not None else ''):
+            if end is not None and k >= end:
+                break
+            if start is None or k >= start:
+                yield self._decode(k), value
+
+    def __repr__(self):
+        return '<Segment data_path={data_path} key_count={keys}>'\
+            .format(data_path=self._data_path, keys=self.key_count)
+
+
+class SegmentSet(object):
+    """ 多个segment的集合, 例如一个任务全部分区的输出, 每个segment的key范围可以重叠
+    """
+
+    def __init__(self, data_paths, typed_keys=False):
+        self._segments = [Segment(p, typed_keys) for p in data_paths]
+        self._typed_keys = typed_keys
+
+    def get(self, key):
+        values = []
+        for s in self._segments:
+            values.extend(s.get(key))
+        return values
+
+    def scan(self, start=None, end=None):
+        """ 合并全部segment的范围扫描结果, 按key的顺序返回
+        """
+        return heapq.merge(*[s.scan(start, end) for s in self._segments])
+
+    def close(self):
+        for s in self._segments:
+            s.close()
+
+    def __repr__(self):
+        return '<SegmentSet segments={count}>'.format(count=len(self._segments))
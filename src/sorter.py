@@ -14,16 +14,29 @@ import traceback
 
 logger = logging.getLogger("dominic.internal")
 
+# 合并时每个文件的最小缓冲区
+MIN_BUFFER_SIZE = 64 * 1024
+
 
 class Sorter(object):
     """ 用于打文件排序的实现
     """
 
-    def __init__(self, file_paths, key_func=lambda x: x.split('\0')[0], delimiter='\0', file_is_sorted=False):
+    def __init__(self, file_paths, key_func=lambda x: x.split('\0', 1)[0].rstrip('\n'), delimiter='\0', file_is_sorted=False,
+                 max_fan_in=64, mem_limit=100 * 1024 * 1024, placer=None):
         """
         Args:
             key_func: 获取key的函数, 输入为一条数据, 对于文件来说是一行文本
+                      默认的key不包含换行符, 和segment以及内存中聚合时的key一致
+                      为None时直接比较整行文本, 适用于key已经是保序编码(参考keycodec)的情况,
+                      排序和合并时不需要再解析每一行
+            max_fan_in: 一次合并的最大文件数, 文件数超过时会先分多轮合并
+            mem_limit: 合并时读写缓冲区的总大小, 平均分配给每一个文件
+            placer: placement.SpillPlacer, 设置后排序的结果尽量写入和输入不同的设备
         """
+        if max_fan_in < 2:
+            raise ValueError("max_fan_in should be at least 2. [max_fan_in={fan_in}]"
+                             .format(fan_in=max_fan_in))
         self._file_is_sorted = file_is_sorted
         if file_is_sorted:
             self._sorted_file_paths = file_paths
@@ -32,41 +45,65 @@ class Sorter(object):
             self._file_paths = file_paths
         self._delimiter = delimiter
         self._key_func = key_func
+        self._max_fan_in = max_fan_in
+        self._placer = placer
+        # 输入和输出各占一份缓冲区
+        self._buffer_size = max(MIN_BUFFER_SIZE, int(mem_limit / (max_fan_in + 1)))
+
+        # 最终需要合并的文件, 多轮合并只在第一次迭代时执行
+        self._merge_plan = None
 
         # 记录排序后的总行数和总大小
         self._total_number = 0
         self._total_size = 0
 
-    def sort(self):
+    def _sort_file(self, f):
+        """ 在内存中排序一个文件
+        :return: (排序后的文件路径, 行数, 文件大小)
+        """
+        sorted_file_path = '%s.sorted' % f
+        if self._placer:
+            output_dir = self._placer.place(os.stat(f).st_size, exclude_path=f)
+            sorted_file_path = os.path.join(output_dir, os.path.basename(sorted_file_path))
+        logger.debug("Start to sort file. [original={file_path} sorted={sorted_file_path}]"
+                     .format(file_path=f, sorted_file_path=sorted_file_path))
+        with open(f) as handle:
+            content = handle.readlines()
+            if self._key_func:
+                content.sort(key=self._key_func)
+            else:
+                content.sort()
+
+        # o_前缀在这里的含义是表示original
+        o_line_number = len(content)
+        o_file_size = os.stat(f).st_size
+        logger.debug("File info. [original={file_path} line_number={line_number} "
+                     "size={size}]"
+                     .format(file_path=f, line_number=o_line_number, size=o_file_size))
+
+        with open(sorted_file_path, 'w') as out:
+            out.writelines(content)
+        logger.debug("Succeed to sort file. [original={file_path} "
+                     "sorted={sorted_file_path}]"
+                     .format(file_path=f, sorted_file_path=sorted_file_path))
+        return sorted_file_path, o_line_number, o_file_size
+
+    def sort(self, executor=None):
         """ 对文件进行排序, 排序的方法是按照给定的key_func来进行, 会进行内存中的排序
         内存的使用情况, 就和文件的大小相关了, 存为list, 内存占用会比文件本身大一些
+        :param executor: executor.BoundedExecutor, 设置后多个文件并行排序, 内存占用也会成倍增加
         """
         if self._file_is_sorted:
             return True
         else:
             logger.debug("Start to sort files. [files={files}]".format(files=self._file_paths))
-            for f in self._file_paths:
-                sorted_file_path = '%s.sorted' % f
-                logger.debug("Start to sort file. [original={file_path} sorted={sorted_file_path}]"
-                             .format(file_path=f, sorted_file_path=sorted_file_path))
-                with open(f) as handle:
-                    content = handle.readlines()
-                    content.sort(key=self._key_func)
-
-                # o_前缀在这里的含义是表示original
-                o_line_number = len(content)
-                o_file_size = os.stat(f).st_size
+            if executor:
+                results = executor.map(self._sort_file, self._file_paths)
+            else:
+                results = (self._sort_file(f) for f in self._file_paths)
+            for sorted_file_path, o_line_number, o_file_size in results:
                 self._total_number += o_line_number
                 self._total_size += o_file_size
-                logger.debug("File info. [original={file_path} line_number={line_number} "
-                             "size={size}]"
-                             .format(file_path=f, line_number=o_line_number, size=o_file_size))
-
-                with open(sorted_file_path, 'w') as out:
-                    out.writelines(content)
-                logger.debug("Succeed to sort file. [original={file_path} "
-                             "sorted={sorted_file_path}]"
-                             .format(file_path=f, sorted_file_path=sorted_file_path))
                 self._sorted_file_paths.append(sorted_file_path)
 
             logger.debug("Finish to sort all files. [total_line_number={line_number} "
@@ -80,7 +117,7 @@ class Sorter(object):
         :param f: 文件fd
         :return: generator, 通过key_func获取的key和原始的line
         """
-        with open(f) as fd:
+        with open(f, 'r', self._buffer_size) as fd:
             for l in fd:
                 try:
                     yield self._key_func(l), l
@@ -88,6 +125,73 @@ class Sorter(object):
                     logger.warn("Unknown exception.[line={line} exception={exc}]"
                                 .format(line=l, exc=traceback.format_exc()))
 
+    def _build_line_iterator(self, f):
+        """ 构建一个file的迭代器, 只返回原始的line, 用于直接比较整行的情况
+        """
+        with open(f, 'r', self._buffer_size) as fd:
+            for l in fd:
+                yield l
+
+    def _merge(self, file_paths):
+        """ 合并多个已排序的文件
+        :return: generator, key和原始的line
+        """
+        if self._key_func:
+            return heapq.merge(*[self._build_file_iterator(f) for f in file_paths])
+        else:
+            merged = heapq.merge(*[self._build_line_iterator(f) for f in file_paths])
+            return ((l.split(self._delimiter, 1)[0], l) for l in merged)
+
+    def _plan_merge(self):
+        """ 文件数超过max_fan_in时, 每一轮合并最小的若干个文件, 直到剩余的文件数不超过max_fan_in
+        第一轮合并(N - 2) % (max_fan_in - 1) + 2个文件, 之后每轮合并max_fan_in个,
+        最后一轮刚好剩下max_fan_in个文件, 这样重复读写的数据量最少
+        :return: 最终需要合并的文件路径
+        """
+        file_paths = list(self._sorted_file_paths)
+        merge_counter = 0
+        if len(file_paths) > self._max_fan_in:
+            merge_count = (len(file_paths) - 2) % (self._max_fan_in - 1) + 2
+        while len(file_paths) > self._max_fan_in:
+            file_paths.sort(key=lambda f: os.stat(f).st_size)
+            inputs, file_paths = file_paths[:merge_count], file_paths[merge_count:]
+
+            merge_counter += 1
+            merged_file_path = '%s.merged_%d' % (self._sorted_file_paths[0], merge_counter)
+            logger.debug("Start to merge files. [files={files} merged={merged_file_path}]"
+                         .format(files=inputs, merged_file_path=merged_file_path))
+            with open(merged_file_path, 'w', self._buffer_size) as out:
+                for _, l in self._merge(inputs):
+                    out.write(l)
+
+            # 只清理中间合并的文件, 排序后的文件保持不变
+            for f in inputs:
+                if f not in self._sorted_file_paths:
+                    os.remove(f)
+            file_paths.append(merged_file_path)
+            merge_count = self._max_fan_in
+        return file_paths
+
+    def close(self):
+        """ 删除多轮合并产生的文件, 排序后的文件保持不变
+        """
+        for f in self._merge_plan or []:
+            if f not in self._sorted_file_paths and os.path.exists(f):
+                os.remove(f)
+        self._merge_plan = None
+
+    @property
+    def sorted_file_paths(self):
+        return self._sorted_file_paths
+
+    def iter_files(self):
+        """ 逐个文件迭代排序后的数据, 不进行合并, 同一个key只在一个文件中时可以按文件分别处理
+        :return: 每个文件一个generator, key和原始的line
+        """
+        if not self._file_is_sorted:
+            raise ValueError("Not sorted.")
+        return [self._merge([f]) for f in self._sorted_file_paths]
+
     def __repr__(self):
         return '<Sorter id={_id}>'.format(_id=id(self))
 
@@ -95,9 +199,10 @@ class Sorter(object):
         """ 需要先调用sort来进行排序, 才可以进行遍历
         """
         if self._file_is_sorted:
+            if self._merge_plan is None:
+                self._merge_plan = self._plan_merge()
             emitted_counter = 0
-            iterables = [self._build_file_iterator(f) for f in self._sorted_file_paths]
-            for key, values in heapq.merge(*iterables):
+            for key, values in self._merge(self._merge_plan):
                 emitted_counter += 1
                 if emitted_counter % 100000 == 0:
                     logger.debug("Emit item in sorter. [sorter={sorter} emitted={emitted} "
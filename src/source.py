@@ -21,13 +21,15 @@ class Source(object):
     """ 一个获取数据的源, 抽象封装几种方法用来支持多种源的扩展
     """
 
-    def __init__(self, name, line_handler=None):
+    def __init__(self, name, line_handler=None, schema=None):
         """
         Args:
             line_handler: function, 处理行的函数, 接受一个参数line, 返回处理后的结果(tuple或list)
                           line的类型根据不同的数据源有所不同
+            schema: schema.Schema, 设置后将每一行解析为record, 解析失败的行会被跳过并计数
         """
         self._line_handler = line_handler
+        self._schema = schema
         self._current_size = 0
         self._current_length = 0
         self._name = name
@@ -111,7 +113,11 @@ class Source(object):
                              "process={process:.2f}%]"
                              .format(source=self, length=self._current_length,
                                      process=self.process))
-            if self._line_handler:
+            if self._schema:
+                record = self._schema.parse(line)
+                if record is not None:
+                    yield record
+            elif self._line_handler:
                 try:
                     yield self._line_handler(line)
                 except TypeError:
@@ -130,14 +136,17 @@ class Source(object):
         logger.debug("Finish to iterate source. [source={source} length={length} "
                      "process={process:.2f}%]"
                      .format(source=self, length=self._current_length, process=self.process))
+        if self._schema and self._schema.error_count:
+            logger.warn("Some lines failed to parse with schema. [source={source} "
+                        "error_count={count}]".format(source=self, count=self._schema.error_count))
 
 
 class FileSource(Source):
     """ 文件源封装
     """
 
-    def __init__(self, name, file_paths, line_handler=None):
-        super(FileSource, self).__init__(name=name, line_handler=line_handler)
+    def __init__(self, name, file_paths, line_handler=None, schema=None):
+        super(FileSource, self).__init__(name=name, line_handler=line_handler, schema=schema)
         self._file_paths = file_paths
         self._file_handles = []
         self._file_size = 0
@@ -173,6 +182,164 @@ class FileSource(Source):
         return len(line)
 
 
+class TailFileSource(Source):
+    """ 只读取文件中上一次读取之后追加的完整行, 用于增量执行
+    通过(设备号, inode)识别文件, 文件被替换(例如日志轮转)或者被截断时从头读取;
+    最后一行没有换行符时认为还在写入中, 留到下一次读取
+    """
+
+    def __init__(self, name, file_paths, positions=None, line_handler=None, schema=None):
+        """
+        Args:
+            positions: dict, 文件的绝对路径 => (设备号, inode, 偏移量), 上一次读取结束的位置
+        """
+        super(TailFileSource, self).__init__(name=name, line_handler=line_handler, schema=schema)
+        positions = positions if positions else {}
+        self._file_paths = file_paths
+        self._files = []
+        self._positions = {}
+        for file_path in file_paths:
+            if not os.path.isfile(file_path):
+                raise ValueError("File does not exist. [file_path={file_path}]"
+                                 .format(file_path=file_path))
+            abs_path = os.path.abspath(file_path)
+            handle = open(file_path, 'r')
+            stat = os.fstat(handle.fileno())
+            identity = (stat.st_dev, stat.st_ino)
+            start = 0
+            if abs_path in positions:
+                device, inode, offset = positions[abs_path]
+                if (device, inode) != identity:
+                    logger.warn("File was replaced, read from the beginning. [file_path={file_path}]"
+                                .format(file_path=file_path))
+                elif stat.st_size < offset:
+                    logger.warn("File was truncated, read from the beginning. [file_path={file_path}]"
+                                .format(file_path=file_path))
+                else:
+                    start = offset
+            self._files.append((abs_path, handle, identity, start, stat.st_size))
+            self._positions[abs_path] = identity + (start,)
+        self._file_size = sum(end - start for _, _, _, start, end in self._files)
+
+    def __del__(self):
+        for _, handle, _, _, _ in self._files:
+            handle.close()
+
+    @property
+    def size(self):
+        """ 本次需要读取的新数据的大小
+        """
+        return self._file_size
+
+    @property
+    def positions(self):
+        """ 每个文件已经读取到的位置, 格式和参数positions相同, 迭代结束后用于下一次读取
+        """
+        return dict(self._positions)
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return '<TailFileSource name={name} file_paths={file_paths}>'\
+            .format(name=self._name, file_paths=self._file_paths)
+
+    def _iterate(self):
+        for abs_path, handle, identity, start, end in self._files:
+            handle.seek(start)
+            position = start
+            # 只读取到创建时的文件大小, 之后追加的数据留到下一次
+            while position < end:
+                line = handle.readline()
+                if not line.endswith('\n'):
+                    break
+                position += len(line)
+                self._positions[abs_path] = identity + (position,)
+                yield line
+
+    def _get_size(self, line):
+        return len(line)
+
+
+class FileSplitSource(Source):
+    """ 文件中的一段, 用于把一个大文件切分给多个worker处理
+    以行为单位, 起始位置落在[start, end)中的行属于这一段
+    """
+
+    def __init__(self, name, file_path, start, end, line_handler=None, schema=None):
+        super(FileSplitSource, self).__init__(name=name, line_handler=line_handler, schema=schema)
+        if not os.path.isfile(file_path):
+            raise ValueError("File does not exist. [file_path={file_path}]"
+                             .format(file_path=file_path))
+        self._file_path = file_path
+        self._start = start
+        self._end = end
+
+    @property
+    def size(self):
+        return self._end - self._start
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return '<FileSplitSource name={name} file_path={file_path} start={start} end={end}>'\
+            .format(name=self._name, file_path=self._file_path, start=self._start, end=self._end)
+
+    def _iterate(self):
+        with open(self._file_path, 'r') as handle:
+            position = self._start
+            if self._start > 0:
+                # 跳过上一段中未结束的行, 如果start恰好是行首, 只会读到上一行的\n
+                handle.seek(self._start - 1)
+                position += len(handle.readline()) - 1
+            while position < self._end:
+                line = handle.readline()
+                if not line:
+                    break
+                position += len(line)
+                yield line
+
+    def _get_size(self, line):
+        return len(line)
+
+
+class MultiFileSource(Source):
+    """ 多个文件源的封装, 每一行会带上所属数据源的tag, 用于reduce端join
+    """
+
+    def __init__(self, name, inputs, line_handler=None):
+        """
+        Args:
+            inputs: dict, tag => 文件路径的list
+        """
+        super(MultiFileSource, self).__init__(name=name, line_handler=line_handler)
+        self._inputs = inputs
+        self._sources = [(tag, FileSource(name='%s_%s' % (name, tag), file_paths=file_paths))
+                         for tag, file_paths in sorted(inputs.items())]
+
+    @property
+    def size(self):
+        return sum(s.size for _, s in self._sources)
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return '<MultiFileSource name={name} inputs={inputs}>'\
+            .format(name=self._name, inputs=self._inputs)
+
+    def _iterate(self):
+        """ 返回(tag, line)
+        """
+        for tag, s in self._sources:
+            for line in s._iterate():
+                yield tag, line
+
+    def _get_size(self, line):
+        return len(line[1])
+
+
 class MongoDBSource(Source):
     """ MongoDB数据源
     """
@@ -242,6 +409,7 @@ class SourceFactory(object):
     mappings = {
         'file': FileSource,
         'mongo': MongoDBSource,
+        'multi': MultiFileSource,
     }
 
     def __init__(self, env):
@@ -253,6 +421,13 @@ class SourceFactory(object):
         return {
             'name': self._env.name,
             'file_paths': self._env.input_path,
+            'schema': self._env.schema,
+        }
+
+    def _get_multi_kwargs(self):
+        return {
+            'name': self._env.name,
+            'inputs': self._env.input_path,
         }
 
     def _get_mongo_kwargs(self):
@@ -57,6 +57,33 @@ def safeunicode(obj, encoding='utf-8'):
         return str(obj).decode(encoding, 'ignore')
 
 
+def safestr(obj, encoding='utf-8'):
+    r"""
+    Converts any given object to utf-8 encoded string.
+
+        >>> safestr('hello')
+        'hello'
+        >>> safestr(u'\u1234')
+        '\xe1\x88\xb4'
+        >>> safestr(2)
+        '2'
+    """
+    if isinstance(obj, unicode):
+        return obj.encode(encoding)
+    elif isinstance(obj, str):
+        return obj
+    else:
+        return str(obj)
+
+
+def split_record(line, delimiter='\0'):
+    """ 将切割时写入的一行文本拆分为key和value
+    :return: (key, value), 没有value时value为空字符串
+    """
+    fields = line.rstrip('\n').split(delimiter, 1)
+    return fields[0], fields[1] if len(fields) > 1 else ''
+
+
 def mkdir(p):
     try:
         os.makedirs(p)
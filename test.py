@@ -1,16 +1,23 @@
 #!/bin/env python
 # ^_^ encoding: utf-8 ^_^
+import os
+import sys
 import threading
 import logging
 import Queue
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+import executor
+
+DEFAULT_NUM_THREADS = 8
+
 
 def do_threaded_work(work_items, work_func, num_threads=None, per_sync_timeout=1, preserve_result_ordering=True):
     """ Executes work_func on each work_item. Note: Execution order is not preserved, but output ordering is (optionally).
 
         Parameters:
-        - num_threads               Default: len(work_items)  --- Number of threads to use process items in work_items.
-        - per_sync_timeout          Default: 1                --- Each synchronized operation can optionally timeout.
+        - num_threads               Default: min(len(work_items), 8) --- Number of threads to use process items in work_items.
+        - per_sync_timeout          Default: 1                --- Deprecated, work items are fed through a bounded queue instead.
         - preserve_result_ordering  Default: True             --- Reorders result_item to match original work_items ordering.
 
         Return:
@@ -30,50 +37,21 @@ def do_threaded_work(work_items, work_func, num_threads=None, per_sync_timeout=1
         # print(results)
         print(repr(result_items))
     """
-    global wrapped_work_func
     if not num_threads:
-        num_threads = len(work_items)
-
-    work_queue = Queue.Queue()
-    result_queue = Queue.Queue()
-
-    index = 0
-    for work_item in work_items:
-        if preserve_result_ordering:
-            work_queue.put((index, work_item))
-        else:
-            work_queue.put(work_item)
-        index += 1
+        num_threads = min(len(work_items), DEFAULT_NUM_THREADS) or 1
 
-    if preserve_result_ordering:
-        wrapped_work_func = lambda work_item: (work_item[0], work_func(work_item[1]))
+    def safe_work_func(work_item):
+        try:
+            return work_func(work_item)
+        except:
+            logging.exception('Error in do_threaded_work')
 
-    start_logging_with_thread_info()
-
-    # spawn a pool of threads, and pass them queue instance
-    for _ in range(num_threads):
-        if preserve_result_ordering:
-            t = ThreadedWorker(work_queue, result_queue, work_func=wrapped_work_func, queue_timeout=per_sync_timeout)
-        else:
-            t = ThreadedWorker(work_queue, result_queue, work_func=work_func, queue_timeout=per_sync_timeout)
-        t.setDaemon(True)
-        t.start()
-
-    work_queue.join()
-    stop_logging_with_thread_info()
+    with executor.BoundedExecutor(num_threads) as _executor:
+        result_items = [result for result in _executor.map(safe_work_func, work_items,
+                                                          ordered=preserve_result_ordering)
+                        if result]
 
     logging.info('work_queue joined')
-
-    result_items = []
-    while not result_queue.empty():
-        result = result_queue.get(timeout=per_sync_timeout)
-        logging.info('found result[:500]: ' + repr(result)[:500])
-        if result:
-            result_items.append(result)
-
-    if preserve_result_ordering:
-        result_items = [work_item for index, work_item in result_items]
-
     return result_items
 
 
@@ -0,0 +1,24 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" 测试共用的路径设置和MapReduce任务
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+import job
+
+logging.getLogger('dominic.internal').addHandler(logging.NullHandler())
+
+
+class WordCount(job.MapReduce):
+
+    def map(self, line):
+        for word in line.split():
+            yield word, 1
+
+    def reduce(self, key, values):
+        yield key, sum(int(i) for i in values)
@@ -0,0 +1,107 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" hash聚合的测试, 包括热点key导致的递归切割
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import aggregator
+
+
+class RecordingAggregator(aggregator.HashAggregator):
+    """ 记录每次切割的文件和层数
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingAggregator, self).__init__(*args, **kwargs)
+        self.repartitions = []
+
+    def _repartition(self, f, depth):
+        self.repartitions.append((os.path.basename(f), depth))
+        return super(RecordingAggregator, self)._repartition(f, depth)
+
+
+class HashAggregatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, records):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as fd:
+            for key, value in records:
+                fd.write('%s\0%s\n' % (key, value))
+        return path
+
+    def aggregate(self, agg):
+        return dict((key, sorted(values)) for key, values in agg)
+
+    def expected(self, records):
+        groups = {}
+        for key, value in records:
+            groups.setdefault(key, []).append(str(value))
+        return dict((key, sorted(values)) for key, values in groups.iteritems())
+
+    def test_hot_key(self):
+        rng = random.Random(7)
+        records = [('hot', i) for i in xrange(3000)] + \
+                  [('k%d' % rng.randint(0, 500), i) for i in xrange(3000)]
+        rng.shuffle(records)
+        path = self.write('part', records)
+        agg = RecordingAggregator([path], 2000, max_depth=10)
+        self.assertEqual(self.aggregate(agg), self.expected(records))
+        # 递归切割过, 但是热点key所在的文件不再变小后就停止了, 远没有到达max_depth
+        depths = [depth for _, depth in agg.repartitions]
+        self.assertTrue(max(depths) >= 1)
+        self.assertTrue(max(depths) < 9)
+        # 切割出的子文件都已经删除
+        self.assertEqual(os.listdir(self.temp_dir), ['part'])
+
+    def test_single_key_stops(self):
+        records = [('hot', i) for i in xrange(2000)]
+        path = self.write('part', records)
+        agg = RecordingAggregator([path], 1000, max_depth=4)
+        self.assertEqual(self.aggregate(agg), self.expected(records))
+        # 只有一个key时切割不会让文件变小, 只切割一次
+        self.assertEqual(agg.repartitions, [('part', 0)])
+        self.assertEqual(os.listdir(self.temp_dir), ['part'])
+
+
+class HashModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(11)
+        self.input_path = os.path.join(self.temp_dir, 'input')
+        with open(self.input_path, 'w') as fd:
+            for _ in xrange(2000):
+                fd.write('hot hot k%d\n' % rng.randint(0, 300))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_job(self, reduce_mode):
+        temp_path = os.path.join(self.temp_dir, 'temp_' + reduce_mode)
+        mr = helpers.WordCount({'input_path': [self.input_path], 'output_path': [self.temp_dir],
+                                'name': 'wc', 'temp_path': [temp_path], 'mem_limit': 5000,
+                                'reduce_mode': reduce_mode})
+        return dict(i for grouped in mr._execute() for i in mr._reduce_wrapper(grouped))
+
+    def test_same_as_sort(self):
+        hashed = self.run_job('hash')
+        self.assertEqual(hashed['hot'], 4000)
+        self.assertEqual(hashed, self.run_job('sort'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" cluster.Coordinator的行为测试
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import collections
+import glob
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import cluster
+
+
+
+class FlakyWordCount(helpers.WordCount):
+    """ 第一次处理某些行时失败, 一部分通过异常, 一部分直接退出worker进程
+    """
+
+    marker_dir = None
+
+    def map(self, line):
+        if line.startswith('fail'):
+            marker = os.path.join(self.marker_dir, line.strip())
+            if not os.path.exists(marker):
+                open(marker, 'w').close()
+                if line.startswith('fail_exit'):
+                    os._exit(3)
+                raise ValueError("flaky")
+        return helpers.WordCount.map(self, line)
+
+
+class CoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.marker_dir = os.path.join(self.temp_dir, 'markers')
+        os.mkdir(self.marker_dir)
+        FlakyWordCount.marker_dir = self.marker_dir
+
+        rng = random.Random(3)
+        lines = [' '.join(rng.choice('abcdefgh') for _ in xrange(5)) + '\n' for _ in xrange(3000)]
+        lines[100] = 'fail_raise a\n'
+        lines[2000] = 'fail_exit b\n'
+        self.expected = collections.Counter(w for l in lines for w in l.split())
+        self.input_path = os.path.join(self.temp_dir, 'input')
+        with open(self.input_path, 'w') as fd:
+            fd.writelines(lines)
+        self.temp_path = os.path.join(self.temp_dir, 'temp')
+        self.output_path = os.path.join(self.temp_dir, 'output')
+        self._worker_main = cluster._worker_main
+
+    def tearDown(self):
+        cluster._worker_main = self._worker_main
+        shutil.rmtree(self.temp_dir)
+
+    def make_job(self):
+        return FlakyWordCount({'input_path': [self.input_path], 'output_path': [self.output_path],
+                               'temp_path': [self.temp_path], 'name': 'flaky', 'mem_limit': 8000})
+
+    def read_output(self, paths):
+        result = collections.Counter()
+        for p in paths:
+            with open(p) as fd:
+                for l in fd:
+                    key, value = eval(l)
+                    result[key] += value
+        return result
+
+    def test_failed_tasks_are_retried(self):
+        paths = self.make_job().run_distributed(2, max_retries=3)
+        self.assertEqual(self.read_output(paths), self.expected)
+        self.assertEqual(os.listdir(self.temp_path), [])
+        self.assertEqual(sorted(os.listdir(self.output_path)), sorted(os.path.basename(p) for p in paths))
+
+    def test_workers_exiting_before_connecting_are_replaced(self):
+        worker_main = cluster._worker_main
+        marker_dir = self.marker_dir
+
+        def exit_early(*args):
+            if len(glob.glob(os.path.join(marker_dir, 'early_*'))) < 3:
+                open(os.path.join(marker_dir, 'early_%d' % os.getpid()), 'w').close()
+                os._exit(5)
+            return worker_main(*args)
+
+        cluster._worker_main = exit_early
+        paths = self.make_job().run_distributed(2, max_retries=3)
+        self.assertEqual(self.read_output(paths), self.expected)
+
+    def test_too_many_worker_exits(self):
+        cluster._worker_main = lambda *args: os._exit(1)
+        self.assertRaises(RuntimeError, self.make_job().run_distributed, 2, max_retries=1)
+
+
+    def test_empty_input(self):
+        open(self.input_path, 'w').close()
+        paths = self.make_job().run_distributed(2)
+        self.assertEqual(self.read_output(paths), collections.Counter())
+
+
+if __name__ == '__main__':
+    unittest.main()
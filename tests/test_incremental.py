@@ -0,0 +1,105 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" 增量执行的测试, 包括追加, 未写完的行, 日志轮转, 截断和执行失败
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import incremental
+
+
+class FailingWordCount(helpers.WordCount):
+    """ 遇到boom时reduce失败
+    """
+
+    def reduce(self, key, values):
+        if key == 'boom':
+            raise RuntimeError('boom')
+        return super(FailingWordCount, self).reduce(key, values)
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.temp_dir, 'input')
+        self.state_path = os.path.join(self.temp_dir, 'state')
+        self.write('w', '')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, mode, data):
+        with open(self.input_path, mode) as fd:
+            fd.write(data)
+
+    def run_job(self, cls=helpers.WordCount):
+        mr = cls({'input_path': [self.input_path], 'output_path': [self.temp_dir], 'name': 'wc',
+                  'temp_path': [os.path.join(self.temp_dir, 'temp')]})
+        return mr.run_incremental(self.state_path)
+
+    def state(self):
+        state = incremental.TailState(self.state_path)
+        try:
+            return dict(state.items()), state.positions
+        finally:
+            state.close()
+
+    def offset(self):
+        return self.state()[1][os.path.abspath(self.input_path)][2]
+
+    def test_append(self):
+        self.write('w', 'a b\na\n')
+        self.assertEqual(self.run_job(), {'a': 2, 'b': 1})
+        self.write('a', 'a c\n')
+        # 只返回本次更新的key
+        self.assertEqual(self.run_job(), {'a': 3, 'c': 1})
+        self.assertEqual(self.state()[0], {'a': 3, 'b': 1, 'c': 1})
+        self.assertEqual(self.run_job(), {})
+
+    def test_partial_line(self):
+        self.write('w', 'a\nb')
+        self.assertEqual(self.run_job(), {'a': 1})
+        self.assertEqual(self.offset(), 2)
+        self.write('a', 'c\n')
+        self.assertEqual(self.run_job(), {'bc': 1})
+        self.assertEqual(self.state()[0], {'a': 1, 'bc': 1})
+
+    def test_rotation(self):
+        self.write('w', 'a\na\n')
+        self.run_job()
+        # 轮转后新文件比读取位置长, 仍然需要通过inode识别出是新文件
+        os.rename(self.input_path, self.input_path + '.1')
+        self.write('w', 'b\nb\nb\n')
+        self.assertEqual(self.run_job(), {'b': 3})
+        self.assertEqual(self.state()[0], {'a': 2, 'b': 3})
+        self.assertEqual(self.state()[1][os.path.abspath(self.input_path)][1:],
+                         (os.stat(self.input_path).st_ino, 6))
+
+    def test_truncation(self):
+        self.write('w', 'a\na\na\n')
+        self.run_job()
+        self.write('w', 'b\n')
+        self.assertEqual(self.run_job(), {'b': 1})
+        self.assertEqual(self.state()[0], {'a': 3, 'b': 1})
+        self.assertEqual(self.offset(), 2)
+
+    def test_failure_keeps_state(self):
+        self.write('w', 'a\n')
+        self.run_job()
+        before = self.state()
+        self.write('a', 'a boom\n')
+        self.assertRaises(RuntimeError, self.run_job, FailingWordCount)
+        self.assertEqual(self.state(), before)
+        # 失败的数据在下一次执行时重新处理
+        self.assertEqual(self.run_job(), {'a': 2, 'boom': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" MapReduce在内存中聚合和切割到文件时结果一致的测试
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+
+
+class Records(helpers.WordCount):
+    """ key和value中包含unicode和无法写入的非ASCII字符
+    """
+
+    def map(self, line):
+        key, value = line.split()
+        yield key.decode('utf-8'), value.decode('utf-8')
+
+    def reduce(self, key, values):
+        yield key, sorted(values)
+
+
+class SinglePass(helpers.WordCount):
+
+    def reduce(self, key, values):
+        yield key, len(values)
+
+
+class InMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(4)
+        self.input_path = os.path.join(self.temp_dir, 'input')
+        with open(self.input_path, 'w') as fd:
+            for _ in xrange(500):
+                fd.write('%s %s\n' % (rng.choice(['a', 'b', 'c']), rng.choice(['x', 'y', '\xe4\xb8\xad'])))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_job(self, cls, mem_limit, **kwargs):
+        conf = {'input_path': [self.input_path], 'output_path': [self.temp_dir], 'name': 'records',
+                'temp_path': [os.path.join(self.temp_dir, 'temp')], 'mem_limit': mem_limit}
+        conf.update(kwargs)
+        mr = cls(conf)
+        return [i for grouped in mr._execute() for i in mr._reduce_wrapper(grouped)]
+
+    def test_same_result_as_spill(self):
+        for reduce_mode in ('sort', 'hash'):
+            in_memory = self.run_job(Records, 10 ** 8, reduce_mode=reduce_mode)
+            spilled = self.run_job(Records, 1000, reduce_mode=reduce_mode)
+            self.assertEqual(sorted(in_memory), sorted(spilled))
+            self.assertEqual(set(type(k) for k, _ in in_memory), set([str]))
+            self.assertTrue(all('\xe4' not in v for _, values in in_memory for v in values))
+
+    def test_values_are_single_pass(self):
+        for mem_limit in (10 ** 8, 1000):
+            for reduce_mode in ('sort', 'hash'):
+                self.assertRaises(TypeError, self.run_job, SinglePass, mem_limit,
+                                  reduce_mode=reduce_mode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" keycodec的行为测试
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import keycodec
+
+
+
+class KeyCodecTest(unittest.TestCase):
+
+    def assert_order_preserved(self, values):
+        values = sorted(values)
+        self.assertEqual(values, sorted(values, key=keycodec.encode))
+        for a, b in zip(values, values[1:]):
+            self.assertEqual(a < b, keycodec.encode(a) < keycodec.encode(b), (a, b))
+            self.assertEqual(a == b, keycodec.encode(a) == keycodec.encode(b), (a, b))
+
+    def test_mixed_numbers(self):
+        self.assertEqual(sorted([2, 1.5, 10, 0.5], key=keycodec.encode), [0.5, 1.5, 2, 10])
+        rng = random.Random(1)
+        values = [rng.randint(-2 ** 63, 2 ** 63 - 1) for _ in xrange(2000)]
+        values += [rng.uniform(-1e20, 1e20) for _ in xrange(2000)]
+        values += [2 ** 63 - 1, -2 ** 63, 2 ** 53, 2 ** 53 + 1, float(2 ** 53), 1e300, -1e300,
+                   float('inf'), float('-inf'), 0.1, -0.1, 0, 3, 3.0000001]
+        self.assert_order_preserved(values)
+
+    def test_equal_numbers_share_encoding(self):
+        self.assertEqual(keycodec.encode(1), keycodec.encode(1.0))
+        self.assertEqual(keycodec.encode(0.0), keycodec.encode(-0.0))
+        self.assertEqual(repr(keycodec.decode(keycodec.encode(-0.0))), '0')
+        self.assertEqual(repr(keycodec.decode(keycodec.encode(0.5))), '0.5')
+
+    def test_strings_and_tuples(self):
+        self.assert_order_preserved(['', 'a', 'a\x00', 'a\x00b', 'a\x01', 'ab', 'b', '\xff'])
+        self.assert_order_preserved([(1, 'b'), (1, 'a', 2), (0.5, 'z'), (2,), ()])
+        self.assertEqual(sorted([(), 'a', 1], key=keycodec.encode), [1, 'a', ()])
+
+    def test_round_trip(self):
+        for value in [0, -1, 2 ** 63 - 1, -2 ** 63, 1.25, 'a\x00b', (1, ('x', 2.5)), u'中']:
+            decoded = keycodec.decode(keycodec.encode(value))
+            expected = value.encode('utf-8') if isinstance(value, unicode) else value
+            self.assertEqual(decoded, expected)
+        encoded = keycodec.encode('k') + keycodec.encode(2)
+        self.assertEqual(keycodec.decode_prefix(encoded), ('k', keycodec.encode(2)))
+
+    def test_unsupported(self):
+        self.assertRaises(TypeError, keycodec.encode, None)
+        self.assertRaises(ValueError, keycodec.encode, 2 ** 63)
+
+
+
+class MixedNumbers(helpers.WordCount):
+
+    def map(self, line):
+        yield 1, 1
+        yield 1.0, 1
+        yield (1, 'a'), 1
+        yield [1.0, 'a'], 1
+
+
+class TypedKeyPartitionTest(unittest.TestCase):
+    """ 相等的key切割到同一个文件, 分区单独聚合时也只有一组
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.temp_dir, 'input')
+        with open(self.input_path, 'w') as fd:
+            fd.write('x\n' * 1000)
+        self.expected = [(1, 2000), ((1, 'a'), 2000)]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_job(self, **kwargs):
+        conf = {'input_path': [self.input_path], 'output_path': [os.path.join(self.temp_dir, 'out')],
+                'temp_path': [os.path.join(self.temp_dir, 'temp')], 'name': 'mixed',
+                'typed_keys': True, 'mem_limit': 2000}
+        conf.update(kwargs)
+        return MixedNumbers(conf)
+
+    def test_hash_mode(self):
+        mr = self.make_job(reduce_mode='hash')
+        result = [i for grouped in mr._execute() for i in mr._reduce_wrapper(grouped)]
+        self.assertEqual(sorted(result), self.expected)
+
+    def test_top(self):
+        self.assertEqual(sorted(self.make_job().top(5)), self.expected)
+
+    def test_coordinator(self):
+        result = []
+        for p in self.make_job().run_distributed(2):
+            with open(p) as fd:
+                result.extend(eval(l) for l in fd)
+        self.assertEqual(sorted(result), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
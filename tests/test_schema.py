@@ -0,0 +1,50 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" schema解析tsv, csv和json的测试
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import schema
+
+
+class SchemaTest(unittest.TestCase):
+
+    def fields(self):
+        return [schema.Field('name', default='-'), schema.Field('count', int, default=0)]
+
+    def test_tsv(self):
+        s = schema.Schema(self.fields())
+        self.assertEqual(s.parse('a\t3\n'), ('a', 3))
+        self.assertEqual(s.parse('\t\n'), ('-', 0))
+        self.assertEqual(s.parse('0\n'), ('0', 0))
+        self.assertEqual(s.parse('\xe4\xb8\xad\t1\n'), ('\xe4\xb8\xad', 1))
+
+    def test_csv(self):
+        s = schema.Schema(self.fields(), format='csv')
+        self.assertEqual(s.parse('"a,b",3\n'), ('a,b', 3))
+
+    def test_json_str(self):
+        s = schema.Schema(self.fields(), format='json')
+        record = s.parse('{"name": "\\u4e2d", "count": 1}')
+        self.assertEqual(record, ('\xe4\xb8\xad', 1))
+        self.assertEqual(type(record.name), str)
+        # 数字和bool转换为str, 不会因为是假值而变成default
+        self.assertEqual(s.parse('{"name": 0}'), ('0', 0))
+        self.assertEqual(s.parse('{"name": false}'), ('False', 0))
+        self.assertEqual(s.parse('{"name": 1.5}').name, '1.5')
+        self.assertEqual(s.parse('{"name": ""}'), ('-', 0))
+        self.assertEqual(s.parse('{"name": null}'), ('-', 0))
+        self.assertEqual(s.parse('{}'), ('-', 0))
+
+    def test_errors(self):
+        s = schema.Schema(self.fields(), error_log_interval=100)
+        self.assertIsNone(s.parse('a\tb\n'))
+        self.assertEqual(s.error_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" segment的行为测试
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import collections
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import job
+import segment
+
+
+
+class SegmentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, lines):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as fd:
+            fd.writelines(lines)
+        return path
+
+    def test_get_and_scan(self):
+        lines = ['k%04d\0%d\n' % (i // 3, i) for i in xrange(3000)]
+        path = self.write('data', lines)
+        for bloom_error_rate in (None, 0.01):
+            s = segment.build_segment(path, block_size=256, bloom_error_rate=bloom_error_rate)
+            self.assertEqual(s.key_count, 1000)
+            self.assertEqual(s.get('k0500'), ['1500', '1501', '1502'])
+            self.assertEqual(s.get('k0999'), ['2997', '2998', '2999'])
+            self.assertEqual(s.get('k05'), [])
+            self.assertEqual(s.get('zzz'), [])
+            scanned = list(s.scan('k0010', 'k0012'))
+            self.assertEqual([k for k, _ in scanned], ['k0010'] * 3 + ['k0011'] * 3)
+            self.assertEqual(len(list(s.scan())), 3000)
+            s.close()
+
+    def test_unsorted_data(self):
+        path = self.write('data', ['b\0x\n', 'a\0x\n'])
+        self.assertRaises(ValueError, segment.build_segment, path)
+
+    def test_keys_below_newline(self):
+        path = self.write('input', ['a\tb\n', 'a\n'])
+
+        class Lines(job.MapReduce):
+            def map(self, line):
+                yield line
+
+            def reduce(self, key, values):
+                yield key
+
+        mr = Lines({'input_path': [path], 'output_path': [self.temp_dir], 'name': 'lines',
+                    'temp_path': [os.path.join(self.temp_dir, 'temp')], 'index_output': True})
+        mr.top(1)
+        segments = mr.segments()
+        self.assertEqual(segments.get('a'), [''])
+        self.assertEqual(segments.get('a\tb'), [''])
+        self.assertEqual([k for k, _ in segments.scan()], ['a', 'a\tb'])
+        segments.close()
+
+    def test_typed_keys(self):
+        rng = random.Random(2)
+        numbers = [rng.choice([1, 2, 10, 2.5, -3]) for _ in xrange(5000)]
+        path = self.write('input', ['%s\n' % n for n in numbers])
+
+        class Numbers(helpers.WordCount):
+            def map(self, line):
+                yield float(line) if '.' in line else int(line), 1
+
+        mr = Numbers({'input_path': [path], 'output_path': [self.temp_dir], 'name': 'numbers',
+                      'temp_path': [os.path.join(self.temp_dir, 'temp')], 'mem_limit': 20000,
+                      'index_output': True, 'typed_keys': True, 'bloom_error_rate': 0.01})
+        mr.top(1)
+        segments = mr.segments()
+        counts = collections.Counter(numbers)
+        for n in (1, 2, 10, 2.5, -3):
+            self.assertEqual(len(segments.get(n)), counts[n])
+        self.assertEqual(len(segments.get(2.0)), counts[2])
+        self.assertEqual(segments.get(3), [])
+        self.assertEqual(sorted(set(k for k, _ in segments.scan(2, 10))), [2, 2.5])
+        segments.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#!/bin/env python
+# ^_^ encoding: utf-8 ^_^
+""" 外排的多轮合并测试
+    python -m unittest discover -s tests
+"""
+
+from __future__ import absolute_import, division, print_function, with_statement
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import helpers  # 需要先导入, 设置src的路径
+import sorter
+
+
+class SorterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        rng = random.Random(3)
+        self.lines = []
+        self.file_paths = []
+        # 大小不同的分区, 多轮合并时会优先合并小文件
+        for i in xrange(20):
+            lines = ['k%05d\0%d\n' % (rng.randint(0, 10000), i) for _ in xrange(rng.randint(1, 200))]
+            path = os.path.join(self.temp_dir, 'part_%d' % i)
+            with open(path, 'w') as fd:
+                fd.writelines(lines)
+            self.lines.extend(lines)
+            self.file_paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def merged_files(self):
+        return [f for f in os.listdir(self.temp_dir) if '.merged_' in f]
+
+    def check(self, **kwargs):
+        s = sorter.Sorter(self.file_paths, **kwargs)
+        s.sort()
+        result = [l for _, l in s]
+        self.assertEqual([l.split('\0', 1)[0] for l in result],
+                         sorted(l.split('\0', 1)[0] for l in self.lines))
+        self.assertEqual(sorted(result), sorted(self.lines))
+        # 最后一轮刚好剩下max_fan_in个文件, 再次迭代时不会重新合并
+        self.assertEqual(len(s._merge_plan), kwargs['max_fan_in'])
+        merged = self.merged_files()
+        self.assertEqual(len(merged), len([f for f in s._merge_plan if '.merged_' in f]))
+        self.assertEqual([l for _, l in s], result)
+        self.assertEqual(self.merged_files(), merged)
+        s.close()
+        self.assertEqual(self.merged_files(), [])
+        # 排序后的文件保持不变
+        self.assertTrue(all(os.path.exists(f) for f in s.sorted_file_paths))
+
+    def test_fan_in(self):
+        for max_fan_in in (2, 3):
+            self.check(max_fan_in=max_fan_in)
+            self.check(max_fan_in=max_fan_in, key_func=None)
+
+    def test_invalid_fan_in(self):
+        self.assertRaises(ValueError, sorter.Sorter, self.file_paths, max_fan_in=1)
+
+
+if __name__ == '__main__':
+    unittest.main()